@@ -0,0 +1,283 @@
+import argparse
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+from data import bootstrap, parallel, team
+import model as probability_model
+import pk_shootout
+import solver
+
+PROBABILITY_TYPES = ('empirical', 'simulated')
+KICK_PROBS = (0.65, solver.SINGLE_KICK_PROB, 0.75)  # conversion rates compared by default
+N_BINS = 10  # equal-width bins of the reliability curve
+PROBABILITY_EPSILON = 1e-6  # predictions are clipped this far from 0 and 1 for the log-loss
+PATTERN_CHUNK_SIZE = 8  # held-out shootout patterns per task handed to a worker
+KICK_COLUMNS = ['Game_id', 'Penalty_Number', 'Goal']
+STATE_SHAPE = (solver.MAX_KICKS + 1, solver.MAX_SCORE + 1, solver.MAX_SCORE + 1)
+
+
+class CalibrationReport(NamedTuple):
+    """How well one configuration's win probabilities matched the shootouts they were made for.
+
+    Every prediction is team 1's win probability after a kick that left the shootout undecided,
+    scored against whether team 1 went on to win. The reliability curve bins the predictions into
+    equal-width bins, empty bins are NaN.
+    """
+    probability_type: str
+    single_kick_prob: float
+    n_shootouts: int
+    n_predictions: int
+    brier_score: float
+    log_loss: float
+    bin_edges: np.ndarray
+    bin_counts: np.ndarray
+    mean_predictions: np.ndarray
+    observed_frequencies: np.ndarray
+
+
+def read_shootouts(file_path: str) -> np.ndarray:
+    """Read a kick-level CSV (possibly compressed) or Parquet file into an (N, kicks) array of
+    makes, one row per shootout.
+
+    Takes the same files as `data/create_pk_data_dict.py`. Shootouts shorter than the longest one
+    are padded with misses, which `PKShootout.replay_shootouts` ignores after the deciding kick.
+    """
+    if file_path.endswith('.parquet'):
+        df_kicks = pd.read_parquet(file_path, columns=KICK_COLUMNS)
+    else:
+        df_kicks = pd.read_csv(file_path, usecols=KICK_COLUMNS)
+    df_kicks = df_kicks[df_kicks.Goal.notna()]
+    game_index = pd.factorize(df_kicks.Game_id)[0]
+    kick_index = df_kicks.Penalty_Number.to_numpy(dtype=np.int64) - 1
+    kicks = np.zeros((game_index.max() + 1, kick_index.max() + 1), dtype=bool)
+    kicks[game_index, kick_index] = df_kicks.Goal.to_numpy() == 1
+    return kicks
+
+
+def calibration_report(
+    probability_type: str,
+    single_kick_prob: float,
+    n_shootouts: int,
+    predictions: np.ndarray,
+    outcomes: np.ndarray,
+    n_bins: int = N_BINS,
+) -> CalibrationReport:
+    """Brier score, log-loss and reliability curve of a set of predictions and outcomes."""
+    outcomes = outcomes.astype(float)
+    clipped = np.clip(predictions, PROBABILITY_EPSILON, 1 - PROBABILITY_EPSILON)
+    bin_edges = np.linspace(0, 1, n_bins + 1)
+    bins = np.digitize(predictions, bin_edges[1:-1])
+    bin_counts = np.bincount(bins, minlength=n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_predictions = np.bincount(bins, predictions, n_bins) / bin_counts
+        observed_frequencies = np.bincount(bins, outcomes, n_bins) / bin_counts
+    return CalibrationReport(
+        probability_type=probability_type,
+        single_kick_prob=single_kick_prob,
+        n_shootouts=n_shootouts,
+        n_predictions=len(predictions),
+        brier_score=float(np.mean((predictions - outcomes) ** 2)),
+        log_loss=float(-np.mean(
+            outcomes * np.log(clipped) + (1 - outcomes) * np.log(1 - clipped)
+        )),
+        bin_edges=bin_edges,
+        bin_counts=bin_counts,
+        mean_predictions=mean_predictions,
+        observed_frequencies=observed_frequencies,
+    )
+
+
+def backtest_chunk(
+    probability_type: str,
+    single_kick_prob: float,
+    prior_strength: float,
+    kicking_order: str,
+    state_wins: np.ndarray,
+    state_totals: np.ndarray,
+    pattern_wins: np.ndarray,
+    pattern_visits: np.ndarray,
+    pattern_kicks: Sequence[np.ndarray],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Predict every kick of the shootouts in a chunk of patterns, each pattern scored by tables
+    compiled without one of its shootouts.
+
+    A pattern's shootouts add the same counts (`pattern_wins`, `pattern_visits`), so taking one
+    of them out of the counts gives the leave-one-out tables for all of them, compiled once and
+    replayed in a single batch. Returns the predictions and whether team 1 won, flattened.
+    """
+    # nothing to fall back on for states the held-out shootout was the only one to reach, so
+    # they are simulated like any other score with no history
+    no_history = np.full(STATE_SHAPE, np.nan)
+    shootout = pk_shootout.PKShootout(
+        probability_type=probability_type,
+        prior_strength=prior_strength,
+        model=probability_model.ProbabilityModel(
+            file_path='',
+            mtime_ns=0,
+            win_probabilities=no_history,
+            state_wins=state_wins,
+            state_totals=state_totals,
+            ci_lower=no_history,
+            ci_upper=no_history,
+        ),
+        kicking_order=kicking_order,
+        single_kick_prob=single_kick_prob,
+    )
+
+    predictions, outcomes = [], []
+    for wins, visits, kicks in zip(pattern_wins, pattern_visits, pattern_kicks):
+        shootout.state_wins = state_wins - wins.reshape(STATE_SHAPE).astype(np.int64)
+        shootout.state_totals = state_totals - visits.reshape(STATE_SHAPE).astype(np.int64)
+        shootout.compile_tables()
+        replay = shootout.replay_shootouts(kicks)
+        # the kicks before the deciding one, after which the shootout was still live
+        live = np.arange(kicks.shape[1]) < replay.deciding_kick[:, None] - 1
+        team_1_won = replay.team_1_score[:, -1] > replay.team_2_score[:, -1]
+        predictions.append(replay.team_1_probability[live])
+        outcomes.append(np.broadcast_to(team_1_won[:, None], live.shape)[live])
+    return np.concatenate(predictions), np.concatenate(outcomes)
+
+
+def run_backtest(
+    kicks: np.ndarray,
+    probability_types: Sequence[str] = PROBABILITY_TYPES,
+    kick_probs: Sequence[float] = KICK_PROBS,
+    prior_strength: float = pk_shootout.PRIOR_STRENGTH,
+    kicking_order: team.KickingOrder | str = solver.ABAB,
+    n_workers: int | None = None,
+    n_bins: int = N_BINS,
+) -> list[CalibrationReport]:
+    """Leave-one-shootout-out backtest of every probability type and conversion rate.
+
+    `kicks` is an (N, kicks) array of makes, like `read_shootouts` gives, and shootouts that are
+    never decided are dropped. The state counts are built from the shootouts themselves, so every
+    shootout is scored by tables that never saw it. A shootout only adds counts along its
+    regulation kicks, so shootouts are grouped by those and the tables are compiled once per
+    group and configuration. The groups are split into chunks fanned out over `n_workers`
+    processes with `parallel.map_chunks`.
+    """
+    kicking_order = team.kicking_pattern(kicking_order)
+    kicks = np.asarray(kicks).astype(bool)
+    replay = pk_shootout.PKShootout(kicking_order=kicking_order).replay_shootouts(kicks)
+    decided = replay.deciding_kick > 0
+    kicks, n_kicks = kicks[decided], replay.deciding_kick[decided]
+    team_1_won = replay.team_1_score[decided, -1] > replay.team_2_score[decided, -1]
+
+    # group the shootouts by the counts they add, see `data/create_pk_data_dict.py`
+    n_regulation_kicks = np.minimum(n_kicks, solver.MAX_KICKS)
+    regulation_kicks = kicks[:, :solver.MAX_KICKS] & (
+        np.arange(min(kicks.shape[1], solver.MAX_KICKS)) < n_regulation_kicks[:, None]
+    )
+    outcomes = regulation_kicks @ (1 << np.arange(regulation_kicks.shape[1]))
+    patterns, pattern_index, pattern_counts = np.unique(
+        np.stack([outcomes, n_regulation_kicks, team_1_won]),
+        axis=1,
+        return_inverse=True,
+        return_counts=True,
+    )
+    pattern_visits, pattern_wins = bootstrap.pattern_state_counts(
+        outcomes=patterns[0],
+        n_kicks=patterns[1],
+        team_1_won=patterns[2].astype(bool),
+        team_1_kicked=solver.team_1_kicked(np.arange(1, solver.MAX_KICKS + 1), kicking_order),
+    )
+    state_wins = (pattern_counts @ pattern_wins).reshape(STATE_SHAPE).astype(np.int64)
+    state_totals = (pattern_counts @ pattern_visits).reshape(STATE_SHAPE).astype(np.int64)
+    pattern_kicks = [kicks[pattern_index == pattern] for pattern in range(len(pattern_counts))]
+
+    configurations = [
+        (probability_type, single_kick_prob)
+        for probability_type in probability_types
+        for single_kick_prob in kick_probs
+    ]
+    chunks = [
+        slice(start, start + PATTERN_CHUNK_SIZE)
+        for start in range(0, len(pattern_counts), PATTERN_CHUNK_SIZE)
+    ]
+    tasks = [(configuration, chunk) for configuration in configurations for chunk in chunks]
+    results = parallel.map_chunks(
+        backtest_chunk,
+        [probability_type for (probability_type, _), _ in tasks],
+        [single_kick_prob for (_, single_kick_prob), _ in tasks],
+        [prior_strength] * len(tasks),
+        [kicking_order] * len(tasks),
+        [state_wins] * len(tasks),
+        [state_totals] * len(tasks),
+        [pattern_wins[chunk] for _, chunk in tasks],
+        [pattern_visits[chunk] for _, chunk in tasks],
+        [pattern_kicks[chunk] for _, chunk in tasks],
+        n_workers=n_workers,
+    )
+
+    reports = []
+    for index, (probability_type, single_kick_prob) in enumerate(configurations):
+        configuration_results = results[index * len(chunks):(index + 1) * len(chunks)]
+        reports.append(calibration_report(
+            probability_type=probability_type,
+            single_kick_prob=single_kick_prob,
+            n_shootouts=len(kicks),
+            predictions=np.concatenate([predictions for predictions, _ in configuration_results]),
+            outcomes=np.concatenate([outcomes for _, outcomes in configuration_results]),
+            n_bins=n_bins,
+        ))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Leave-one-shootout-out backtest and calibration of the win probabilities"
+    )
+    parser.add_argument(
+        '--csv', required=True,
+        help="Kick-level shootout CSV, optionally compressed, or a .parquet file, the same as "
+        "data/create_pk_data_dict.py takes"
+    )
+    parser.add_argument(
+        '--probability-types', nargs='+', default=list(PROBABILITY_TYPES),
+        choices=PROBABILITY_TYPES,
+    )
+    parser.add_argument('--kick-probs', type=float, nargs='+', default=list(KICK_PROBS))
+    parser.add_argument('--prior-strength', type=float, default=pk_shootout.PRIOR_STRENGTH)
+    parser.add_argument(
+        '--kicking-order', default=solver.ABAB, help="Repeating kicking order, e.g. AB or ABBA"
+    )
+    parser.add_argument('--n-bins', type=int, default=N_BINS)
+    parser.add_argument('--n-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    reports = run_backtest(
+        kicks=read_shootouts(args.csv),
+        probability_types=args.probability_types,
+        kick_probs=args.kick_probs,
+        prior_strength=args.prior_strength,
+        kicking_order=args.kicking_order,
+        n_workers=args.n_workers,
+        n_bins=args.n_bins,
+    )
+    print(f"{reports[0].n_shootouts} shootouts, {reports[0].n_predictions} predictions each")
+    print(f"{'type':<10} {'rate':>8} {'brier':>8} {'log-loss':>9}")
+    for report in reports:
+        print(
+            f"{report.probability_type:<10} {report.single_kick_prob:>8.4f} "
+            f"{report.brier_score:>8.4f} {report.log_loss:>9.4f}"
+        )
+    for report in reports:
+        print(f"\nReliability, {report.probability_type} at {report.single_kick_prob:.4f}")
+        for lower, upper, count, mean_prediction, observed_frequency in zip(
+            report.bin_edges[:-1],
+            report.bin_edges[1:],
+            report.bin_counts,
+            report.mean_predictions,
+            report.observed_frequencies,
+        ):
+            if count:
+                print(
+                    f"  {lower:.1f}-{upper:.1f}: predicted {mean_prediction:.3f}, "
+                    f"observed {observed_frequency:.3f} ({count} kicks)"
+                )
+
+
+if __name__ == "__main__":
+    main()
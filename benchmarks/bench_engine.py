@@ -0,0 +1,267 @@
+"""Benchmark the probability engine and the table builder on synthetic data and save the results.
+
+Runs offline: the builder reads synthetic shootouts from a temporary CSV instead of the kagglehub
+dataset. Results are written as JSON, one file per commit, so two runs can be compared.
+
+Run from the repository root:
+    python benchmarks/bench_engine.py [--scales 1 100 10000] [--compare results/<commit>.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+import numpy as np
+
+REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, path.join(REPO_ROOT, 'data'))
+
+import live_load_generator  # noqa: E402
+import model as probability_model  # noqa: E402
+import pk_shootout  # noqa: E402
+import solver  # noqa: E402
+
+RESULTS_DIR = path.join(REPO_ROOT, 'benchmarks', 'results')
+WORLD_CUP_SHOOTOUTS = 36  # scale 1 is the size of the real dataset
+BUILDER_SCALES = [1, 100, 10_000]
+REGRESSION_TOLERANCE = 1.25  # flag anything this many times slower than the baseline
+
+
+def summarize(times_ns: list[int] | np.ndarray) -> dict:
+    """Latency stats in microseconds."""
+    times_us = np.asarray(times_ns, dtype=float) / 1000
+    return {
+        'unit': 'us',
+        'n': len(times_us),
+        'min': float(times_us.min()),
+        'median': float(np.median(times_us)),
+        'mean': float(times_us.mean()),
+        'p99': float(np.percentile(times_us, 99)),
+    }
+
+
+def time_calls(func, repeat: int) -> list[int]:
+    times_ns = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        times_ns.append(time.perf_counter_ns() - start)
+    return times_ns
+
+
+def bench_kick(repeat: int) -> dict:
+    """Per-call latency of `kick` over every make/miss path of the 10 regulation kicks."""
+    pk = pk_shootout.PKShootout()
+    times_ns = []
+    for _ in range(repeat):
+        for kicks in itertools.product([True, False], repeat=solver.MAX_KICKS):
+            pk.reset_shootout()
+            for kick_success in kicks:
+                if pk.shootout_is_over:
+                    break
+                start = time.perf_counter_ns()
+                pk.kick(kick_success)
+                times_ns.append(time.perf_counter_ns() - start)
+    return summarize(times_ns)
+
+
+def bench_simulate(probability_type: str, repeat: int) -> dict[str, dict]:
+    """Latency of `simulate_win_probability` for every live regulation state.
+
+    Warm calls reuse the cached solved table, cold calls use new rates every time so each one
+    solves the table from scratch.
+    """
+    pk = pk_shootout.PKShootout(probability_type=probability_type)
+    live_states = [
+        tuple(state) for state in np.argwhere(
+            ~np.isnan(solver.reachable_states()) & ~solver.over_states()
+        ).tolist()
+    ]
+    warm_ns, cold_ns = [], []
+    for repetition in range(repeat):
+        for n_kicks_attempted, team_1_score, team_2_score in live_states:
+            start = time.perf_counter_ns()
+            pk.simulate_win_probability(
+                n_kicks_attempted, team_1_score, team_2_score, solver.SINGLE_KICK_PROB
+            )
+            warm_ns.append(time.perf_counter_ns() - start)
+
+        # rates no cache has seen yet
+        rng = np.random.default_rng(repetition)
+        start = time.perf_counter_ns()
+        pk.simulate_win_probability(*live_states[0], rng.uniform(0.5, 0.9, solver.MAX_KICKS))
+        cold_ns.append(time.perf_counter_ns() - start)
+    return {
+        f'simulate_win_probability.{probability_type}.warm': summarize(warm_ns),
+        f'simulate_win_probability.{probability_type}.cold': summarize(cold_ns),
+    }
+
+
+def bench_construction(repeat: int) -> dict[str, dict]:
+    """`PKShootout()` with nothing cached (load and compile the model) and with the model shared."""
+    def construct_cold():
+        probability_model.clear_model_cache()
+        pk_shootout.PKShootout()
+
+    cold_ns = time_calls(construct_cold, repeat)
+    warm_ns = time_calls(pk_shootout.PKShootout, repeat)
+    return {
+        'PKShootout.cold': summarize(cold_ns),
+        'PKShootout.warm': summarize(warm_ns),
+    }
+
+
+def bench_reset(repeat: int) -> dict:
+    pk = pk_shootout.PKShootout()
+    times_ns = []
+    for _ in range(repeat):
+        for kick_success in [True, False, True, True]:
+            pk.kick(kick_success)
+        start = time.perf_counter_ns()
+        pk.reset_shootout()
+        times_ns.append(time.perf_counter_ns() - start)
+    return summarize(times_ns)
+
+
+def bench_trajectory(repeat: int) -> dict[str, dict]:
+    """Building the trajectory index once, then reading a shootout's trajectory off it."""
+    pk = pk_shootout.PKShootout()
+
+    def build_index():
+        pk.trajectories = None
+        pk.model.compiled_tables.pop((*pk.tables_key, 'trajectories'), None)
+        pk.trajectory_index()
+
+    build_ns = time_calls(build_index, repeat)
+    for kick_success in [True, False, True, True, False, True, True]:
+        pk.kick(kick_success)
+    return {
+        'trajectory_index': summarize(build_ns),
+        'trajectory': summarize(time_calls(pk.trajectory, repeat * 1000)),
+    }
+
+
+def bench_backtest(repeat: int) -> dict:
+    """The leave-one-out backtest of every default configuration on World Cup-sized history."""
+    import backtest
+
+    kicks, _ = live_load_generator.synthetic_shootouts(WORLD_CUP_SHOOTOUTS, seed=0)
+    return summarize(time_calls(lambda: backtest.run_backtest(kicks, n_workers=1), repeat))
+
+
+def synthetic_kicks_csv(n_shootouts: int, file_path: str, seed: int = 0):
+    """Write shootouts with the historic conversion rate in the layout of the kagglehub CSV."""
+    kicks, n_kicks = live_load_generator.synthetic_shootouts(n_shootouts, seed)
+    game_id = np.repeat(np.arange(1, n_shootouts + 1), n_kicks)
+    penalty_number = np.arange(len(game_id)) - np.repeat(np.cumsum(n_kicks) - n_kicks, n_kicks) + 1
+    goal = kicks[np.arange(kicks.shape[1]) < n_kicks[:, None]].astype(int)
+    with open(file_path, 'w') as f:
+        f.write('Game_id,Penalty_Number,Goal\n')
+        np.savetxt(f, np.column_stack([game_id, penalty_number, goal]), fmt='%d', delimiter=',')
+
+
+def bench_builder(scale: int, repeat: int) -> dict:
+    """A full `create_pk_data_dict.main` rebuild from a synthetic CSV, without the stage cache."""
+    import create_pk_data_dict
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        csv_path = path.join(scratch_dir, 'shootouts.csv')
+        synthetic_kicks_csv(WORLD_CUP_SHOOTOUTS * scale, csv_path)
+        argv = sys.argv
+        sys.argv = [
+            'create_pk_data_dict.py', '--csv', csv_path, '--output-dir', scratch_dir, '--no-cache'
+        ]
+        try:
+            times_ns = time_calls(create_pk_data_dict.main, repeat)
+        finally:
+            sys.argv = argv
+    return summarize(times_ns)
+
+
+def git_commit() -> str:
+    result = subprocess.run(
+        ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    return result.stdout.strip() or 'unknown'
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print the median of every benchmark against a baseline run and list the regressions."""
+    regressions = []
+    for name, stats in results['benchmarks'].items():
+        baseline_stats = baseline['benchmarks'].get(name)
+        if baseline_stats is None:
+            continue
+        ratio = stats['median'] / baseline_stats['median']
+        print(
+            f"{name}: {baseline_stats['median']:.2f} -> {stats['median']:.2f} "
+            f"{stats['unit']} ({ratio:.2f}x)"
+        )
+        if ratio > tolerance:
+            regressions.append(f"{name} is {ratio:.2f}x slower than {baseline['commit']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions of each benchmark")
+    parser.add_argument(
+        '--scales', type=int, nargs='*', default=BUILDER_SCALES,
+        help="Builder runs on this many times the World Cup's 36 shootouts",
+    )
+    parser.add_argument(
+        '--output', default=None, help="Defaults to benchmarks/results/<commit>.json"
+    )
+    parser.add_argument('--compare', default=None, help="Results JSON of a baseline run")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    benchmarks = {'kick': bench_kick(args.repeat)}
+    for probability_type in ['empirical', 'simulated']:
+        benchmarks.update(bench_simulate(probability_type, args.repeat))
+    benchmarks.update(bench_construction(args.repeat))
+    benchmarks['reset_shootout'] = bench_reset(args.repeat * 1000)
+    benchmarks.update(bench_trajectory(args.repeat))
+    benchmarks['backtest'] = bench_backtest(args.repeat)
+    for scale in args.scales:
+        # one rebuild is plenty at the largest scales
+        benchmarks[f'create_pk_data_dict.main.{scale}x'] = bench_builder(
+            scale, repeat=args.repeat if scale <= 100 else 1
+        )
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'benchmarks': benchmarks,
+    }
+    for name, stats in benchmarks.items():
+        print(
+            f"{name}: median {stats['median']:.2f} {stats['unit']}, "
+            f"p99 {stats['p99']:.2f} {stats['unit']} ({stats['n']} runs)"
+        )
+
+    output_path = args.output or path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(path.dirname(path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit("REGRESSED: " + "; ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
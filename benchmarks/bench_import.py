@@ -0,0 +1,58 @@
+"""Fail if a cold import of the probability engine goes over budget or pulls in heavy packages.
+
+Run from the repository root: python benchmarks/bench_import.py [--budget-ms 250]
+"""
+import argparse
+import re
+import subprocess
+import sys
+from os import path
+from statistics import median
+
+REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+CORE_MODULES = ['pk_shootout', 'solver', 'model', 'monte_carlo']
+HEAVY_MODULES = ['pandas', 'streamlit', 'kagglehub']
+IMPORT_BUDGET_MS = 250
+
+
+def cold_import_ms(module: str) -> float:
+    """Cumulative import time of a module in a fresh interpreter, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    match = re.search(rf"\|\s*(\d+)\s*\|\s*{module}$", result.stderr, re.MULTILINE)
+    return int(match.group(1)) / 1000
+
+
+def heavy_modules_loaded(module: str) -> list[str]:
+    result = subprocess.run(
+        [sys.executable, '-c', f"import sys, {module}; print(' '.join(sys.modules))"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    loaded = set(result.stdout.split())
+    return [heavy for heavy in HEAVY_MODULES if heavy in loaded]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    for module in CORE_MODULES:
+        import_ms = median(cold_import_ms(module) for _ in range(args.repeat))
+        heavy = heavy_modules_loaded(module)
+        print(f"{module}: {import_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        if import_ms > args.budget_ms:
+            failures.append(f"{module} took {import_ms:.1f} ms to import")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
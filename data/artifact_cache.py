@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from os import path
+from typing import Any, Callable, Sequence
+
+CACHE_DIR = path.join(path.dirname(path.abspath(__file__)), '.cache')
+HASH_BLOCK_SIZE = 1 << 20  # bytes read at a time when hashing a file
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file's contents, read a block at a time so big files aren't held in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def files_digest(file_paths: Sequence[str]) -> str:
+    """One SHA-256 over the contents of several files, in the order given."""
+    return hashlib.sha256(
+        ''.join(file_digest(file_path) for file_path in file_paths).encode()
+    ).hexdigest()
+
+
+class ArtifactCache:
+    """Outputs of pipeline stages on disk, addressed by a hash of everything that went into them.
+
+    A stage's key hashes its name, the cache `version` and its inputs: the content hash of a raw
+    file, the keys of the stages it is derived from and any parameters. The same inputs always
+    give the same key, so a rerun finds the output of every stage whose inputs haven't changed
+    and anything else gets a new key. Outputs are written to a temporary name and renamed into
+    place, so an interrupted run never leaves a half-written artifact behind. `enabled=False`
+    builds every stage without reading or writing the cache.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, version: str = '', enabled: bool = True):
+        self.cache_dir = path.abspath(cache_dir)
+        self.version = version
+        self.enabled = enabled
+        # stages served from the cache and stages built on this run, in the order they ran
+        self.hits = []
+        self.misses = []
+
+    def key(self, stage: str, *inputs: str | int | float | bool | None) -> str:
+        """Content address of a stage's output from its inputs, which must be JSON scalars."""
+        return hashlib.sha256(
+            json.dumps([stage, self.version, *inputs]).encode()
+        ).hexdigest()[:32]
+
+    def artifact_path(self, stage: str, key: str) -> str:
+        return path.join(self.cache_dir, f"{stage}-{key}")
+
+    def load_or_build(self, stage: str, key: str, build: Callable[[], Any]) -> Any:
+        """The pickled output of a stage if it is cached, otherwise build and cache it."""
+        artifact_path = self.artifact_path(stage, key) + '.pkl'
+        if self.enabled and path.exists(artifact_path):
+            self.hits.append(stage)
+            with open(artifact_path, 'rb') as f:
+                return pickle.load(f)
+
+        artifact = build()
+        self.misses.append(stage)
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self.cache_dir, prefix=f".{stage}-", delete=False
+            ) as f:
+                pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, artifact_path)
+        return artifact
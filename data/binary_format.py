@@ -0,0 +1,94 @@
+import json
+import mmap
+
+import numpy as np
+
+# file layout: magic, uint32 version, uint32 header length, JSON header, then each array aligned
+MAGIC = b'PKTABLE\x00'
+VERSION = 1
+ALIGNMENT = 64
+PREAMBLE_SIZE = len(MAGIC) + 8
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def arrays_from_probability_dict(probability_dict: dict) -> dict[str, np.ndarray]:
+    """Lay a probability table out as dense (kicks_attempted, team_1_score, team_2_score) arrays.
+
+    Counts are uint32 and probabilities float32, with NaN for states that have no probability
+    or confidence interval.
+    """
+    max_kicks = max(sub_dict['n_kicks_attempted'] for sub_dict in probability_dict.values())
+    max_score = max(
+        max(sub_dict['team_1_score'], sub_dict['team_2_score'])
+        for sub_dict in probability_dict.values()
+    )
+    shape = (max_kicks + 1, max_score + 1, max_score + 1)
+    arrays = {
+        'win_probability': np.full(shape, np.nan, dtype=np.float32),
+        'wins': np.zeros(shape, dtype=np.uint32),
+        'n_shootouts': np.zeros(shape, dtype=np.uint32),
+        'ci_lower': np.full(shape, np.nan, dtype=np.float32),
+        'ci_upper': np.full(shape, np.nan, dtype=np.float32),
+    }
+    for sub_dict in probability_dict.values():
+        state = (sub_dict['n_kicks_attempted'], sub_dict['team_1_score'], sub_dict['team_2_score'])
+        if sub_dict.get('win_probability') is not None:
+            arrays['win_probability'][state] = sub_dict['win_probability']
+        arrays['wins'][state] = sub_dict.get('wins', 0)
+        arrays['n_shootouts'][state] = sub_dict.get('n_shootouts', 0)
+        if sub_dict.get('ci_lower') is not None:
+            arrays['ci_lower'][state] = sub_dict['ci_lower']
+            arrays['ci_upper'][state] = sub_dict['ci_upper']
+    return arrays
+
+
+def write_arrays(arrays: dict[str, np.ndarray], file_path: str):
+    """Write named fixed-shape arrays after a small JSON header describing where each one is.
+
+    Array offsets are relative to the first aligned byte after the header.
+    """
+    header = {'arrays': []}
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'].append({
+            'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset,
+        })
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(PREAMBLE_SIZE + len(header_bytes))
+
+    with open(file_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([VERSION, len(header_bytes)], dtype='<u4').tobytes())
+        f.write(header_bytes)
+        for array_header, array in zip(header['arrays'], arrays.values()):
+            f.write(b'\x00' * (data_start + array_header['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+
+
+def read_arrays(file_path: str) -> dict[str, np.ndarray]:
+    """Memory-map a file written by `write_arrays` and return read-only, zero-copy arrays.
+
+    Every process that reads the same file shares one page-cached copy of it.
+    """
+    with open(file_path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    assert buffer[:len(MAGIC)] == MAGIC, f"{file_path} is not a binary probability table"
+    version, header_length = np.frombuffer(buffer, dtype='<u4', count=2, offset=len(MAGIC))
+    assert version == VERSION, f"Unsupported binary probability table version {version}"
+    header = json.loads(buffer[PREAMBLE_SIZE:PREAMBLE_SIZE + header_length])
+    data_start = _align(PREAMBLE_SIZE + int(header_length))
+
+    return {
+        array_header['name']: np.frombuffer(
+            buffer,
+            dtype=array_header['dtype'],
+            count=int(np.prod(array_header['shape'])),
+            offset=data_start + array_header['offset'],
+        ).reshape(array_header['shape'])
+        for array_header in header['arrays']
+    }
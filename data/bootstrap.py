@@ -0,0 +1,80 @@
+import numpy as np
+
+MAX_KICKS = 10
+MAX_SCORE = 5
+N_RESAMPLES = 2000
+CONFIDENCE_LEVEL = 0.9
+RESAMPLE_CHUNK_SIZE = 250  # resamples per task handed to a worker
+
+
+def pattern_state_counts(
+    outcomes: np.ndarray, n_kicks: np.ndarray, team_1_won: np.ndarray, team_1_kicked: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Which regulation states each shootout pattern passes through and which of them it wins.
+
+    A pattern is a distinct (outcomes, n_kicks, team_1_won) triple, where bit i of `outcomes` is
+    1 if kick i + 1 of the first `n_kicks` regulation kicks was scored. Returns (visits, wins)
+    of shape (n_patterns, n_states), with states flattened from (kicks_attempted, team_1_score,
+    team_2_score), and a win meaning the team that just kicked went on to win. `team_1_kicked`
+    says which of the regulation kicks team 1 took, see `team.team_1_kicked`.
+    """
+    shape = (MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1)
+    n_patterns = len(outcomes)
+    kicks = (outcomes[:, None] >> np.arange(MAX_KICKS) & 1).astype(bool)
+    taken = np.arange(MAX_KICKS) < n_kicks[:, None]
+    team_1_score = np.cumsum(kicks & taken & team_1_kicked, axis=1)
+    team_2_score = np.cumsum(kicks & taken & ~team_1_kicked, axis=1)
+    states = np.ravel_multi_index(
+        (np.arange(1, MAX_KICKS + 1), team_1_score, team_2_score), shape
+    )
+
+    pattern, kick = np.nonzero(taken)
+    # float so resampling is a BLAS matrix product, integer products don't use it
+    visits = np.zeros((n_patterns, np.prod(shape)))
+    wins = np.zeros((n_patterns, np.prod(shape)))
+    visits[pattern, states[pattern, kick]] = 1
+    wins[pattern, states[pattern, kick]] = team_1_kicked[kick] == team_1_won[pattern]
+    return visits, wins
+
+
+def resample_probabilities(
+    pattern_counts: np.ndarray,
+    visits: np.ndarray,
+    wins: np.ndarray,
+    n_resamples: int,
+    seed: np.random.SeedSequence | int | None = None,
+) -> np.ndarray:
+    """Per-state win rates of `n_resamples` bootstrap resamples of the shootouts.
+
+    Drawing every shootout with replacement is the same as drawing how many times each pattern
+    appears from a multinomial, so a resample costs one matrix product however many shootouts
+    there are. States a resample never reaches are NaN.
+    """
+    rng = np.random.default_rng(seed)
+    n_shootouts = int(pattern_counts.sum())
+    resampled_counts = rng.multinomial(
+        n_shootouts, pattern_counts / n_shootouts, n_resamples
+    ).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (resampled_counts @ wins) / (resampled_counts @ visits)
+
+
+def confidence_intervals(
+    resampled: np.ndarray,
+    pattern_counts: np.ndarray,
+    visits: np.ndarray,
+    confidence_level: float = CONFIDENCE_LEVEL,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Percentile bootstrap interval of the win rate of every state, as dense state arrays.
+
+    `resampled` stacks the output of `resample_probabilities` for every resample. States never
+    reached are NaN.
+    """
+    tail = (1 - confidence_level) / 2
+    shape = (MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1)
+    lower, upper = np.full((2, resampled.shape[1]), np.nan)
+    reached = pattern_counts @ visits > 0
+    lower[reached], upper[reached] = np.nanquantile(
+        resampled[:, reached], [tail, 1 - tail], axis=0
+    )
+    return lower.reshape(shape), upper.reshape(shape)
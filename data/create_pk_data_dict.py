@@ -1,97 +1,69 @@
+import argparse
 import json
-import kagglehub
+import os
+import tempfile
+from functools import cached_property
+from os import path
+from typing import Iterator
+
+import numpy as np
 import pandas as pd
 
+import artifact_cache
+import binary_format
+import bootstrap
+import parallel
 import team
 
-# Download latest version
-PATH = kagglehub.dataset_download("luigibizarro/world-cup-penalty-shootouts-1982-2022")
-
 kt = team.KickingTeam
+KAGGLE_DATASET = "luigibizarro/world-cup-penalty-shootouts-1982-2022"
+MAX_KICKS = 10
+STATE_COLUMNS = ['n_kicks_attempted', 'team_1_score', 'team_2_score']
+DATA_DIR = path.dirname(path.abspath(__file__))
+JSON_TABLE_FILE = 'probability_dict.json'
+BINARY_TABLE_FILE = 'probability_table.bin'
+# the code the cached stages come from, so changing any of it invalidates them
+PIPELINE_SOURCES = [
+    path.join(DATA_DIR, source)
+    for source in ['create_pk_data_dict.py', 'bootstrap.py', 'parallel.py', 'team.py']
+]
+SEED = 0  # bootstrap seed, so rebuilding from the same shootouts gives the same table
+KICK_COLUMNS = ['Game_id', 'Penalty_Number', 'Goal']
+PATTERN_COLUMNS = ['outcomes', 'n_kicks', 'team_1_won']
+CHUNK_SIZE = 1_000_000  # kick rows read at a time when streaming
+ABAB = team.KickingOrder.abab.value
 
 
-def get_df_from_given_score(
-    df_base: pd.DataFrame,
-    n_kicks_attempted: int,
-    team_1_score: int,
-    team_2_score: int
-) -> pd.DataFrame:
-    """Given a score at a point in a shootout, get the dataframe of games/kicks with that score."""
-    assert team_1_score + team_2_score <= n_kicks_attempted, (
-        "Impossible score given number of kicks"
-    )
-    assert team_1_score * 2 <= n_kicks_attempted + 1, "Impossible score given number of kicks"
-    assert team_2_score * 2 <= n_kicks_attempted, "Impossible score given number of kicks"
-    
-    # filter the kicks dataframe to only that point in the shootout and pivot by game
-    df_kicks_happened = df_base[df_base['Penalty_Number'] <= n_kicks_attempted].copy()
-    kick_pivot = df_kicks_happened.pivot_table(
-        values='Goal', index='Game_id', columns='team_order', aggfunc='sum'
-    ).reset_index()
-    if n_kicks_attempted == 1:
-        kick_pivot = kick_pivot[
-            (kick_pivot[kt.team_1.value] == team_1_score)
-        ]
-    # after kick 1, we need both teams scores
-    else:
-        kick_pivot = kick_pivot[
-            (kick_pivot[kt.team_1.value] == team_1_score) &
-            (kick_pivot[kt.team_2.value] == team_2_score)
-        ]
-    
-    # return the initial dataframe based on the game id in the pivoted and filtered frame
-    return df_base[df_base['Game_id'].isin(kick_pivot['Game_id'])].copy()
-
-
-def calc_kicking_team_probability_after_kick(
-    df_kicks_slimmed: pd.DataFrame, df_games: pd.DataFrame,
-    n_kicks_attempted: int, team_1_score: int, team_2_score: int
-) -> float:
-    """Calcluate the probability that the team that just kicked will win the shootout.
-    
-    Use the get_df_from_given_score to get a filtered dataframe and use those game IDs to cut down
-    the games dataframe. With the games dataframe, get the percent of time the team that kicked won
-    """
-    df_status = get_df_from_given_score(
-        df_base=df_kicks_slimmed,
-        n_kicks_attempted=n_kicks_attempted,
-        team_1_score=team_1_score,
-        team_2_score=team_2_score,
-    )
+def download_dataset() -> str:
+    """Download the latest World Cup shootout dataset and return the folder it is in."""
+    # only needed without --csv, so building from a local CSV works offline
+    import kagglehub
 
-    df_games_slim = df_games[df_games.game.isin(df_status.Game_id)]
-    team_kicking = kt.team_1.value if n_kicks_attempted % 2 == 1 else kt.team_2.value
-    return (df_games_slim.winning_team == team_kicking).mean()
+    return kagglehub.dataset_download(KAGGLE_DATASET)
 
 
 def is_score_possible(
-    n_kicks_attempted: int, team_1_score: int, team_2_score: int
+    n_kicks_attempted: int, team_1_score: int, team_2_score: int, kicking_order: str = ABAB
 ):
     # both teams scores cant be greater than attempted kicks
     if team_1_score + team_2_score  > n_kicks_attempted:
         return False
     
-    # team 1 can't be 1 more than half of the total kicks
-    if team_1_score * 2 > n_kicks_attempted + 1:
-        return False
-    
-    # team 2 can't be more than half of the total kicks
-    if team_2_score * 2 > n_kicks_attempted:
+    # neither team can have scored more than the kicks it has taken in this kicking order
+    team_1_kicks = team.team_1_kicks_taken(n_kicks_attempted, kicking_order)
+    team_2_kicks = n_kicks_attempted - team_1_kicks
+    if team_1_score > team_1_kicks or team_2_score > team_2_kicks:
         return False
     
     # assuming the previous, all ties are possible
     if team_1_score == team_2_score:
         return True
 
-    # if we have an even number of kicks, both teams have take the same amount
-    if n_kicks_attempted % 2 == 0:
-        trailing_team_kick_remaining = 5 - n_kicks_attempted / 2
+    # the trailing team has whatever is left of its 5 kicks
+    if team_1_score < team_2_score:
+        trailing_team_kick_remaining = 5 - team_1_kicks
     else:
-        # on an odd kick team 2 has an extra kick remaining
-        if team_1_score < team_2_score:
-            trailing_team_kick_remaining = 5 - (n_kicks_attempted + 1) / 2
-        else:
-            trailing_team_kick_remaining = 5 - (n_kicks_attempted - 1) / 2
+        trailing_team_kick_remaining = 5 - team_2_kicks
 
     # if the previous kick
     if trailing_team_kick_remaining + 1 < abs(team_2_score - team_1_score):
@@ -100,81 +72,468 @@ def is_score_possible(
     return True
 
 
-def main():
-    df_all = pd.read_csv(f"{PATH}/WorldCupShootouts.csv")
-    
-    # get a dataframe of all kicks
-    df_kicks = df_all[df_all.Goal.notna()].copy()
-    df_kicks["team_order"] = df_kicks.Penalty_Number.apply(
-        lambda x: kt.team_1.value if int(x) % 2 == 1 else kt.team_2.value
-    )
-
-    # get a dataframe of all games
-    games = set(df_kicks.Game_id)
-    res = []
-    for game in games:
-        res_dict = {'game': game}
-        temp = df_kicks[df_kicks.Game_id == game]
-        res_dict['n_kicks'] = len(temp)
-        # if the last kick is a goal, the team that kicked won
-        if temp.iloc[-1].Goal == 1:
-            res_dict['winning_team'] = temp.iloc[-1].team_order
+def get_kicks_df(df_all: pd.DataFrame, kicking_order: str = ABAB) -> pd.DataFrame:
+    """Get a dataframe of all kicks in kicking order, with the team that took each kick."""
+    df_kicks = df_all[df_all.Goal.notna()].sort_values(['Game_id', 'Penalty_Number']).copy()
+    df_kicks['team_order'] = np.where(
+        team.team_1_kicked(df_kicks.Penalty_Number.to_numpy(dtype=np.int64), kicking_order),
+        kt.team_1.value,
+        kt.team_2.value,
+    )
+    return df_kicks
+
+
+def build_state_counts(df_kicks: pd.DataFrame) -> pd.DataFrame:
+    """Count how often every score was reached and how often the team that just kicked won.
+
+    A single pass over the kicks: the cumulative score of each team per game gives the state after
+    every kick, and the winner of each game (the last kicker if they scored, otherwise the other
+    team) says whether the kicking team went on to win from there.
+    """
+    goals = df_kicks.Goal.astype(int)
+    is_team_1 = df_kicks.team_order == kt.team_1.value
+    winning_team = get_winning_team(df_kicks)
+
+    df_states = pd.DataFrame({
+        'n_kicks_attempted': df_kicks.Penalty_Number.astype(int),
+        'team_1_score': (goals * is_team_1).groupby(df_kicks.Game_id, sort=False).cumsum(),
+        'team_2_score': (goals * ~is_team_1).groupby(df_kicks.Game_id, sort=False).cumsum(),
+        'wins': (df_kicks.team_order == winning_team).astype(int),
+    })
+    df_states = df_states[df_states.n_kicks_attempted <= MAX_KICKS]
+    return df_states.groupby(STATE_COLUMNS).wins.agg(wins='sum', total='count')
+
+
+def get_winning_team(df_kicks: pd.DataFrame) -> pd.Series:
+    """The winner of each game broadcast back onto every one of its kicks.
+
+    The last kick decides the game, so the last kicker won if they scored and the other team won
+    if they missed.
+    """
+    other_team = np.where(
+        df_kicks.team_order == kt.team_1.value, kt.team_2.value, kt.team_1.value
+    )
+    return pd.Series(
+        np.where(df_kicks.Goal.astype(int) == 1, df_kicks.team_order, other_team),
+        index=df_kicks.index,
+    ).groupby(df_kicks.Game_id, sort=False).transform('last')
+
+
+def get_games_df(df_kicks: pd.DataFrame) -> pd.DataFrame:
+    """Get a dataframe with one row per game: its regulation kicks and whether team 1 won.
+
+    `outcomes` is a bitmask of the regulation kicks that were scored (bit i for kick i + 1) and
+    `n_kicks` how many regulation kicks were taken.
+    """
+    penalty_number = df_kicks.Penalty_Number.astype(int)
+    regulation = penalty_number <= MAX_KICKS
+    kick_bit = np.left_shift(1, np.minimum(penalty_number, MAX_KICKS) - 1)
+    return pd.DataFrame({
+        'Game_id': df_kicks.Game_id,
+        'outcomes': np.where(regulation, df_kicks.Goal.astype(int) * kick_bit, 0),
+        'n_kicks': regulation.astype(int),
+        'team_1_won': get_winning_team(df_kicks) == kt.team_1.value,
+    }).groupby('Game_id', sort=False).agg(
+        outcomes=('outcomes', 'sum'),
+        n_kicks=('n_kicks', 'sum'),
+        team_1_won=('team_1_won', 'first'),
+    )
+
+
+def count_shootout_patterns(df_kicks: pd.DataFrame) -> pd.Series:
+    """Count the games with each distinct sequence of regulation kicks and winner.
+
+    A pattern is a row of `get_games_df` without the game. There are at most a few thousand of
+    them however many games there are, and they are all the bootstrap needs.
+    """
+    return get_games_df(df_kicks).groupby(PATTERN_COLUMNS).size()
+
+
+def merge_shootout_patterns(*shootout_patterns: pd.Series) -> pd.Series:
+    """Add up the pattern counts from several sets of shootouts."""
+    return pd.concat(shootout_patterns).groupby(level=PATTERN_COLUMNS).sum()
+
+
+def bootstrap_intervals(
+    shootout_patterns: pd.Series,
+    kicking_order: str = ABAB,
+    n_resamples: int = bootstrap.N_RESAMPLES,
+    seed: int | None = None,
+    n_workers: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Bootstrap confidence interval of every state's win probability, see `bootstrap`.
+
+    The resamples are split into chunks of `bootstrap.RESAMPLE_CHUNK_SIZE` and fanned out with
+    `parallel.map_chunks`.
+    """
+    patterns = shootout_patterns.index.to_frame(index=False)
+    pattern_counts = shootout_patterns.to_numpy(dtype=np.int64)
+    visits, wins = bootstrap.pattern_state_counts(
+        outcomes=patterns.outcomes.to_numpy(dtype=np.int64),
+        n_kicks=patterns.n_kicks.to_numpy(dtype=np.int64),
+        team_1_won=patterns.team_1_won.to_numpy(dtype=bool),
+        team_1_kicked=team.team_1_kicked(np.arange(1, MAX_KICKS + 1), kicking_order),
+    )
+    chunk_sizes, chunk_seeds = parallel.seeded_chunks(
+        n_resamples, bootstrap.RESAMPLE_CHUNK_SIZE, seed
+    )
+    resampled = parallel.map_chunks(
+        bootstrap.resample_probabilities,
+        [pattern_counts] * len(chunk_sizes),
+        [visits] * len(chunk_sizes),
+        [wins] * len(chunk_sizes),
+        chunk_sizes,
+        chunk_seeds,
+        n_workers=n_workers,
+    )
+    return bootstrap.confidence_intervals(np.concatenate(resampled), pattern_counts, visits)
+
+
+def merge_state_counts(*state_counts: pd.DataFrame) -> pd.DataFrame:
+    """Add up the per-state counts from several sets of shootouts."""
+    return pd.concat(state_counts).groupby(level=STATE_COLUMNS).sum()
+
+
+def read_kick_chunks(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Read the kick columns of a CSV or Parquet file `chunk_size` rows at a time.
+
+    CSVs can be compressed (.gz, .bz2, .zip, .xz, .zst), pandas picks the codec from the
+    extension. Parquet needs pyarrow, which is only imported for .parquet files.
+    """
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(file_path).iter_batches(
+            batch_size=chunk_size, columns=KICK_COLUMNS
+        ):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_path, usecols=KICK_COLUMNS, chunksize=chunk_size)
+
+
+def read_kicks(file_path: str) -> pd.DataFrame:
+    """Read a whole kick-level CSV (possibly compressed) or Parquet file."""
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path, columns=KICK_COLUMNS)
+    return pd.read_csv(file_path)
+
+
+def read_complete_shootouts(
+    file_path: str, chunk_size: int = CHUNK_SIZE, kicking_order: str = ABAB
+) -> Iterator[pd.DataFrame]:
+    """Read a kick file in chunks, yielding kick frames that only hold complete shootouts.
+
+    Expects the rows of each shootout next to each other, as in the World Cup dataset. The last
+    shootout in each chunk may go on in the next one, so it is held back until then.
+    """
+    unfinished_game = None
+    for df_chunk in read_kick_chunks(file_path, chunk_size):
+        if unfinished_game is not None:
+            df_chunk = pd.concat([unfinished_game, df_chunk], ignore_index=True)
+        if df_chunk.empty:
+            continue
+        in_last_game = (df_chunk.Game_id == df_chunk.Game_id.iloc[-1]).to_numpy()
+        unfinished_game = df_chunk[in_last_game]
+        if not in_last_game.all():
+            yield get_kicks_df(df_chunk[~in_last_game], kicking_order)
+    if unfinished_game is not None:
+        yield get_kicks_df(unfinished_game, kicking_order)
+
+
+def stream_counts(
+    file_path: str, chunk_size: int = CHUNK_SIZE, kicking_order: str = ABAB
+) -> tuple[pd.DataFrame, pd.Series]:
+    """Build the per-state counts and shootout patterns from a kick file without ever holding all
+    of it in memory.
+
+    Each shootout is counted as soon as its last row has been read, so memory is bounded by one
+    chunk, the rows of one unfinished shootout and the counts themselves.
+    """
+    state_counts, shootout_patterns = None, None
+    for df_kicks in read_complete_shootouts(file_path, chunk_size, kicking_order):
+        chunk_counts = build_state_counts(df_kicks)
+        chunk_patterns = count_shootout_patterns(df_kicks)
+        if state_counts is None:
+            state_counts, shootout_patterns = chunk_counts, chunk_patterns
         else:
-            res_dict['winning_team'] = temp.iloc[-2].team_order
-        res.append(res_dict)
-    df_games = pd.DataFrame(res)
+            state_counts = merge_state_counts(state_counts, chunk_counts)
+            shootout_patterns = merge_shootout_patterns(shootout_patterns, chunk_patterns)
+    assert state_counts is not None, f"No kicks in {file_path}"
+    return state_counts, shootout_patterns
+
+
+class Pipeline:
+    """The table build as stages: raw CSV -> kick frame -> games frame -> state counts -> model.
+
+    Every stage is cached in `cache` under a hash of its inputs: the contents of the CSV for the
+    kick frame and the key of the stage before it for everything else, so the keys are known
+    before anything is built. Stages are built on first use and only pull in the stages they
+    need, so rerunning on an unchanged CSV hashes the file and reads the cached model. With a
+    `chunk_size` the kicks are streamed straight into the state counts and shootout patterns
+    instead, which land under the same keys as the in-memory build.
+    """
+
+    def __init__(
+        self,
+        csv_path: str,
+        cache: artifact_cache.ArtifactCache,
+        kicking_order: str = ABAB,
+        chunk_size: int | None = None,
+    ):
+        self.csv_path = csv_path
+        self.cache = cache
+        self.kicking_order = team.kicking_pattern(kicking_order)
+        self.chunk_size = chunk_size
+        raw_key = cache.key('raw', artifact_cache.file_digest(csv_path))
+        self.kicks_key = cache.key('kicks', raw_key, self.kicking_order)
+        self.games_key = cache.key('games', self.kicks_key)
+        self.state_counts_key = cache.key('state_counts', self.kicks_key)
+        self.patterns_key = cache.key('patterns', self.games_key)
+
+    @cached_property
+    def df_kicks(self) -> pd.DataFrame:
+        return self.cache.load_or_build(
+            'kicks', self.kicks_key,
+            lambda: get_kicks_df(read_kicks(self.csv_path), self.kicking_order),
+        )
+
+    @cached_property
+    def df_games(self) -> pd.DataFrame:
+        return self.cache.load_or_build(
+            'games', self.games_key, lambda: get_games_df(self.df_kicks)
+        )
+
+    @cached_property
+    def streamed_counts(self) -> tuple[pd.DataFrame, pd.Series]:
+        return stream_counts(self.csv_path, self.chunk_size, self.kicking_order)
+
+    @cached_property
+    def state_counts(self) -> pd.DataFrame:
+        return self.cache.load_or_build(
+            'state_counts', self.state_counts_key,
+            lambda: (
+                self.streamed_counts[0] if self.chunk_size else build_state_counts(self.df_kicks)
+            ),
+        )
+
+    @cached_property
+    def shootout_patterns(self) -> pd.Series:
+        return self.cache.load_or_build(
+            'patterns', self.patterns_key,
+            lambda: (
+                self.streamed_counts[1] if self.chunk_size
+                else self.df_games.groupby(PATTERN_COLUMNS).size()
+            ),
+        )
+
+    def probability_dict(
+        self,
+        n_resamples: int = bootstrap.N_RESAMPLES,
+        seed: int | None = SEED,
+        n_workers: int | None = None,
+    ) -> dict:
+        """The probability table with bootstrap intervals, see `build_probability_dict`.
+
+        An unseeded bootstrap gives different intervals every run, so that table is never cached.
+        """
+        def build() -> dict:
+            intervals = None
+            if n_resamples > 0:
+                intervals = bootstrap_intervals(
+                    self.shootout_patterns, kicking_order=self.kicking_order,
+                    n_resamples=n_resamples, seed=seed, n_workers=n_workers,
+                )
+            return build_probability_dict(self.state_counts, intervals, self.kicking_order)
+
+        if seed is None and n_resamples > 0:
+            return build()
+        return self.cache.load_or_build(
+            'model',
+            self.cache.key('model', self.state_counts_key, self.patterns_key, n_resamples, seed),
+            build,
+        )
+
+
+def pipeline_cache(
+    cache_dir: str = artifact_cache.CACHE_DIR, enabled: bool = True
+) -> artifact_cache.ArtifactCache:
+    """The cache for `Pipeline`, versioned by its code and the pandas that pickled its frames."""
+    return artifact_cache.ArtifactCache(
+        cache_dir,
+        version=f"{artifact_cache.files_digest(PIPELINE_SOURCES)}-pandas-{pd.__version__}",
+        enabled=enabled,
+    )
+
+
+def write_model(probability_dict: dict, output_dir: str = DATA_DIR):
+    """Write the JSON and binary probability tables into `output_dir`.
+
+    Each file is written under a temporary name and renamed over the old one, so a process
+    reloading the table (see `model.load_model`) never reads a half-written file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=output_dir, suffix='.json', delete=False) as fp:
+        json.dump(probability_dict, fp)
+    os.replace(fp.name, path.join(output_dir, JSON_TABLE_FILE))
+    # the same table as memory-mappable arrays for the runtime
+    with tempfile.NamedTemporaryFile(dir=output_dir, suffix='.bin', delete=False) as fp:
+        binary_path = fp.name
+    binary_format.write_arrays(
+        binary_format.arrays_from_probability_dict(probability_dict), binary_path
+    )
+    os.replace(binary_path, path.join(output_dir, BINARY_TABLE_FILE))
+
+
+def load_state_counts(file_path: str) -> pd.DataFrame:
+    """Read the per-state counts back out of a probability table built by this script."""
+    with open(file_path) as f:
+        probability_dict = json.load(f)
+    df_counts = pd.DataFrame(probability_dict.values())
+    df_counts = df_counts[df_counts.n_shootouts > 0].rename(columns={'n_shootouts': 'total'})
+    return df_counts.set_index(STATE_COLUMNS)[['wins', 'total']]
+
 
-    # for every possible score at any point in a shootout, get the probability of winning
+def build_probability_dict(
+    state_counts: pd.DataFrame,
+    intervals: tuple[np.ndarray, np.ndarray] | None = None,
+    kicking_order: str = ABAB,
+) -> dict:
+    """For every possible score at any point in a shootout, get the probability of winning.
+
+    Each state also keeps how many shootouts reached it and how many of those the team that just
+    kicked won, so tables can be merged or updated without going back to the kicks. With
+    `intervals` from `bootstrap_intervals`, states before kick 10 also get the bounds of their
+    confidence interval, otherwise those are None.
+    """
     probability_dict = {}
-    n_kicks_list = list(range(1, 11))
+    n_kicks_list = list(range(1, MAX_KICKS + 1))
     n_goals_list = list(range(0, 6))
     for n_kicks in n_kicks_list:
         for n_goals_team_1 in n_goals_list:
             for n_goals_team_2 in n_goals_list:
-                win_probability = None
-                if is_score_possible(
+                if not is_score_possible(
                     n_kicks_attempted=n_kicks,
                     team_1_score=n_goals_team_1,
-                    team_2_score=n_goals_team_2
+                    team_2_score=n_goals_team_2,
+                    kicking_order=kicking_order,
                 ):
-                    # logic for 10 kicks
-                    if n_kicks == 10:
-                        # if it's a tie set to 0.5
-                        if n_goals_team_1 == n_goals_team_2:
-                            win_probability = 0.5
-                        # if not a tie, team 2 just kicked so assume they lose with a lower score
-                        elif n_goals_team_1 > n_goals_team_2:
-                            win_probability = 0.0
-                        else:
-                            win_probability = 1.0
-
-                    if pd.isna(win_probability):
-                        try:
-                            df_kicks_slim = get_df_from_given_score(
-                                df_base=df_kicks,
-                                n_kicks_attempted=n_kicks,
-                                team_1_score=n_goals_team_1,
-                                team_2_score=n_goals_team_2
-                            )
-                            win_probability = calc_kicking_team_probability_after_kick(
-                                df_kicks_slimmed=df_kicks_slim,
-                                df_games=df_games,
-                                n_kicks_attempted=n_kicks,
-                                team_1_score=n_goals_team_1,
-                                team_2_score=n_goals_team_2
-                            )
-                        except KeyError:
-                            win_probability = None
-                    dict_key = f"{n_kicks}_{n_goals_team_1}_{n_goals_team_2}"
-                    probability_dict[dict_key] = {
-                        'n_kicks_attempted': n_kicks,
-                        'team_1_score': n_goals_team_1,
-                        'team_2_score': n_goals_team_2,
-                        'win_probability': win_probability
-                    }
-
-    with open('probability_dict.json', 'w') as fp:
-        json.dump(probability_dict, fp)
+                    continue
+
+                win_probability = None
+                wins, n_shootouts = 0, 0
+                if (n_kicks, n_goals_team_1, n_goals_team_2) in state_counts.index:
+                    row = state_counts.loc[(n_kicks, n_goals_team_1, n_goals_team_2)]
+                    wins, n_shootouts = int(row.wins), int(row.total)
+                    win_probability = wins / n_shootouts
+
+                # logic for 10 kicks
+                if n_kicks == MAX_KICKS:
+                    # if it's a tie set to 0.5
+                    if n_goals_team_1 == n_goals_team_2:
+                        win_probability = 0.5
+                    # if not a tie, the team that just kicked wins if it has the higher score
+                    else:
+                        team_1_leads = n_goals_team_1 > n_goals_team_2
+                        team_1_kicked = team.team_1_kicked(n_kicks, kicking_order)
+                        win_probability = 1.0 if team_1_leads == team_1_kicked else 0.0
+
+                ci_lower, ci_upper = None, None
+                if intervals is not None and n_kicks < MAX_KICKS:
+                    state = (n_kicks, n_goals_team_1, n_goals_team_2)
+                    if not np.isnan(intervals[0][state]):
+                        ci_lower = float(intervals[0][state])
+                        ci_upper = float(intervals[1][state])
+
+                dict_key = f"{n_kicks}_{n_goals_team_1}_{n_goals_team_2}"
+                probability_dict[dict_key] = {
+                    'n_kicks_attempted': n_kicks,
+                    'team_1_score': n_goals_team_1,
+                    'team_2_score': n_goals_team_2,
+                    'win_probability': win_probability,
+                    'wins': wins,
+                    'n_shootouts': n_shootouts,
+                    'ci_lower': ci_lower,
+                    'ci_upper': ci_upper,
+                }
+    return probability_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build probability_dict.json from shootout kicks")
+    parser.add_argument(
+        '--csv', default=None,
+        help="Kick-level shootout CSV, optionally compressed, or a .parquet file. Defaults to "
+        "the World Cup dataset from kagglehub."
+    )
+    parser.add_argument(
+        '--output-dir', default=DATA_DIR,
+        help="Where to write probability_dict.json and probability_table.bin, defaults to the "
+        "data folder next to this script wherever it is run from"
+    )
+    parser.add_argument(
+        '--cache-dir', default=artifact_cache.CACHE_DIR,
+        help="Where the output of every stage is cached, keyed by a hash of its inputs"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true', help="Build every stage without touching the cache"
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=None,
+        help="Stream the kicks this many rows at a time instead of loading them all at once, "
+        "for datasets too big for memory. Rows of each shootout must be next to each other."
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Fold the shootouts in --csv into the counts of the existing probability_dict.json "
+        "instead of rebuilding from scratch. Only pass shootouts that have not been counted yet."
+    )
+    parser.add_argument(
+        '--merge', nargs='+', default=None, metavar='TABLE',
+        help="Merge the counts of probability tables built on separate shards of shootouts "
+        "instead of reading any kicks."
+    )
+    parser.add_argument(
+        '--n-resamples', type=int, default=bootstrap.N_RESAMPLES,
+        help="Bootstrap resamples for the confidence interval of every state, 0 to skip them. "
+        "Intervals need every shootout, so they are skipped with --incremental and --merge."
+    )
+    parser.add_argument(
+        '--kicking-order', default=ABAB,
+        help="Repeating order the shootouts were kicked in, e.g. AB (the default) or ABBA"
+    )
+    parser.add_argument('--seed', type=int, default=SEED, help="Seed for the bootstrap")
+    parser.add_argument('--n-workers', type=int, default=None, help="Bootstrap processes")
+    args = parser.parse_args()
+
+    cache = pipeline_cache(args.cache_dir, enabled=not args.no_cache)
+    if args.merge:
+        state_counts = merge_state_counts(*[load_state_counts(shard) for shard in args.merge])
+        probability_dict = build_probability_dict(state_counts, kicking_order=args.kicking_order)
+    else:
+        pipeline = Pipeline(
+            csv_path=args.csv or f"{download_dataset()}/WorldCupShootouts.csv",
+            cache=cache,
+            kicking_order=args.kicking_order,
+            chunk_size=args.chunk_size,
+        )
+        if args.incremental:
+            state_counts = merge_state_counts(
+                load_state_counts(path.join(args.output_dir, JSON_TABLE_FILE)),
+                pipeline.state_counts,
+            )
+            probability_dict = build_probability_dict(
+                state_counts, kicking_order=args.kicking_order
+            )
+        else:
+            probability_dict = pipeline.probability_dict(
+                n_resamples=args.n_resamples, seed=args.seed, n_workers=args.n_workers
+            )
+    write_model(probability_dict, args.output_dir)
+    if cache.enabled and (cache.hits or cache.misses):
+        print(
+            f"Cached stages: {', '.join(cache.hits) or 'none'}, "
+            f"built: {', '.join(cache.misses) or 'none'}"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+
+def chunk_sizes(n_items: int, chunk_size: int) -> list[int]:
+    """Split `n_items` into chunks of `chunk_size`, with any remainder in a smaller last chunk."""
+    sizes = [chunk_size] * (n_items // chunk_size)
+    if n_items % chunk_size:
+        sizes.append(n_items % chunk_size)
+    return sizes
+
+
+def seeded_chunks(
+    n_items: int, chunk_size: int, seed: int | None = None
+) -> tuple[list[int], list[np.random.SeedSequence]]:
+    """The `chunk_sizes` of `n_items` and a seed for each chunk.
+
+    Every chunk gets its own child of `np.random.SeedSequence(seed)`, so a seed and chunk size
+    give the same results however many workers the chunks are spread over.
+    """
+    sizes = chunk_sizes(n_items, chunk_size)
+    return sizes, np.random.SeedSequence(seed).spawn(len(sizes))
+
+
+def map_chunks(function: Callable, *chunk_args, n_workers: int | None = None) -> list:
+    """`map` a function over the arguments of every chunk on a pool of processes, in order.
+
+    `n_workers=1` stays in process, None starts one worker per CPU.
+    """
+    if n_workers == 1:
+        return list(map(function, *chunk_args))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(function, *chunk_args))
@@ -1,5 +1,66 @@
 from enum import Enum
+from functools import lru_cache
+
+import numpy as np
 
 class KickingTeam(Enum):
     team_1 = "team_1"
     team_2 = "team_2"
+
+
+class KickingOrder(Enum):
+    """The order teams take their kicks in, as a pattern that repeats for the whole shootout.
+
+    'A' is a team 1 kick and 'B' a team 2 kick. ABBA continues into sudden death, so team 2
+    kicks first in every other round.
+    """
+    abab = "AB"
+    abba = "ABBA"
+
+
+@lru_cache(maxsize=None)
+def kicking_pattern(kicking_order: KickingOrder | str) -> str:
+    """The repeating pattern of a kicking order, e.g. 'ABBA', checked to be a valid shootout.
+
+    Team 1 takes the first kick and every round of two kicks has one kick per team, so a round
+    of sudden death is always one kick each.
+    """
+    pattern = kicking_order.value if isinstance(kicking_order, KickingOrder) else kicking_order
+    assert pattern and set(pattern) <= {'A', 'B'}, f"Kicking orders are made of A and B: {pattern}"
+    assert pattern[0] == 'A', "Team 1 (A) takes the first kick"
+    assert len(pattern) % 2 == 0 and all(
+        pattern[kick] != pattern[kick + 1] for kick in range(0, len(pattern), 2)
+    ), "Every round of two kicks needs one kick per team"
+    return pattern
+
+
+@lru_cache(maxsize=None)
+def _team_1_kick_mask(kicking_order: KickingOrder | str) -> np.ndarray:
+    mask = np.array([kicker == 'A' for kicker in kicking_pattern(kicking_order)])
+    mask.flags.writeable = False
+    return mask
+
+
+def team_1_kicked(n_kicks_attempted, kicking_order: KickingOrder | str = KickingOrder.abab):
+    """Check if team 1 took kick number `n_kicks_attempted` (1-based) in a kicking order.
+
+    Kick 0 counts as team 2 having just kicked. Works on ints or elementwise on NumPy arrays.
+    """
+    pattern = kicking_pattern(kicking_order)
+    if isinstance(n_kicks_attempted, int):
+        return n_kicks_attempted > 0 and pattern[(n_kicks_attempted - 1) % len(pattern)] == 'A'
+    n_kicks_attempted = np.asarray(n_kicks_attempted)
+    return (n_kicks_attempted > 0) & _team_1_kick_mask(kicking_order)[
+        (n_kicks_attempted - 1) % len(pattern)
+    ]
+
+
+def team_1_kicks_taken(n_kicks_attempted, kicking_order: KickingOrder | str = KickingOrder.abab):
+    """Number of the first `n_kicks_attempted` kicks that team 1 took, team 2 took the rest.
+
+    Every round of two kicks is one kick each, so only the kick of an unfinished round depends on
+    the kicking order.
+    """
+    return n_kicks_attempted // 2 + (
+        (n_kicks_attempted % 2 == 1) & team_1_kicked(n_kicks_attempted, kicking_order)
+    )
@@ -0,0 +1,191 @@
+"""Optional counters and timing histograms for the probability engine.
+
+Instrumentation is off by default. The hot paths only check whether `recorder` is None, so leaving
+it off costs a single attribute read per call. Turn it on with `enable`, then `export` the stats
+to one or more sinks:
+
+    stats = instrumentation.StatsSink()
+    instrumentation.enable(sinks=[stats, instrumentation.PrometheusSink('pk.prom')])
+    ...
+    instrumentation.recorder.export()
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Protocol
+
+# upper bounds in seconds, from a microsecond (an array read) to a second (a full rebuild)
+HISTOGRAM_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+# kicks simulated ahead before reaching a known probability, at most a regulation shootout
+DEPTH_BUCKETS = tuple(range(1, 11))
+PROMETHEUS_PREFIX = 'pk_'
+
+
+class Histogram:
+    """Counts of observations per bucket, with Prometheus-style upper bounds."""
+    def __init__(self, buckets: tuple[float, ...] = HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # the last bucket is everything above
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': list(self.buckets),
+            'bucket_counts': list(self.bucket_counts),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class Sink(Protocol):
+    def export(self, snapshot: dict):
+        ...
+
+
+class Instrumentation:
+    """Collects counters and histograms and exports snapshots of them to its sinks.
+
+    Every update and snapshot holds `lock`, so threads sharing the process-wide recorder (e.g.
+    loading models) never lose counts or export a half-updated histogram.
+    """
+    def __init__(self, sinks: list[Sink] | None = None):
+        self.sinks = list(sinks or [])
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = HISTOGRAM_BUCKETS):
+        """Add a value to the `name` histogram, created with `buckets` the first time it's seen."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe how long the block takes in the `name` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'timestamp': time.time(),
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: histogram.to_dict() for name, histogram in self.histograms.items()
+                },
+            }
+
+    def export(self) -> dict:
+        """Send a snapshot of the current stats to every sink and return it."""
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.export(snapshot)
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class StatsSink:
+    """Keeps the latest snapshot in process, e.g. for a debug page or a test."""
+    def __init__(self):
+        self.latest: dict | None = None
+
+    def export(self, snapshot: dict):
+        self.latest = snapshot
+
+
+class FileSink:
+    """Writes every snapshot to a local JSON stats file, replacing the previous one."""
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def export(self, snapshot: dict):
+        _write_atomically(self.file_path, json.dumps(snapshot, indent=2))
+
+
+class PrometheusSink:
+    """Renders snapshots in the Prometheus text format, e.g. for the node exporter's textfile
+    collector.
+
+    The latest rendering is kept in `text`, and also written to `file_path` if one is given.
+    """
+    def __init__(self, file_path: str | None = None):
+        self.file_path = file_path
+        self.text = ''
+
+    def export(self, snapshot: dict):
+        self.text = render_prometheus(snapshot)
+        if self.file_path:
+            _write_atomically(self.file_path, self.text)
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Format a snapshot as Prometheus counters and cumulative histograms."""
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = f"{PROMETHEUS_PREFIX}{_metric_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, histogram in sorted(snapshot['histograms'].items()):
+        metric = f"{PROMETHEUS_PREFIX}{_metric_name(name)}"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(
+            [*histogram['buckets'], '+Inf'], histogram['bucket_counts']
+        ):
+            cumulative_count += bucket_count
+            lines.append(f'{metric}_bucket{{le="{upper_bound}"}} {cumulative_count}')
+        lines += [f"{metric}_sum {histogram['sum']}", f"{metric}_count {histogram['count']}"]
+    return '\n'.join(lines) + '\n'
+
+
+def _metric_name(name: str) -> str:
+    return name.replace('.', '_').replace('-', '_')
+
+
+def _write_atomically(file_path: str, text: str):
+    # readers never see a half-written file
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+    os.replace(temp_path, file_path)
+
+
+# the active instrumentation, None while it is off
+recorder: Instrumentation | None = None
+
+
+def enable(sinks: list[Sink] | None = None) -> Instrumentation:
+    """Start collecting stats process-wide and return the collector."""
+    global recorder
+    recorder = Instrumentation(sinks=sinks)
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = None
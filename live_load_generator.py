@@ -0,0 +1,130 @@
+"""Replay shootouts through `LiveTrackingService` and measure event-to-update latency.
+
+python live_load_generator.py --n-matches 10000 --events-per-second 50000
+"""
+import argparse
+import asyncio
+import time
+from statistics import quantiles
+
+import numpy as np
+
+import live_service
+import pk_shootout
+import solver
+
+# kicks sampled per synthetic shootout, which leaves only a tiny fraction of them still tied
+SYNTHETIC_KICKS = 30
+
+
+def synthetic_shootouts(
+    n_shootouts: int, seed: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Synthetic shootouts with the historic conversion rate, as an (N, kicks) array of makes and
+    the number of kicks each one took to be decided."""
+    rng = np.random.default_rng(seed)
+    kicks = rng.random((n_shootouts, SYNTHETIC_KICKS)) < solver.SINGLE_KICK_PROB
+    replay = pk_shootout.PKShootout().replay_shootouts(kicks)
+    return kicks, np.where(replay.deciding_kick > 0, replay.deciding_kick, kicks.shape[1])
+
+
+def generate_shootouts(n_matches: int, seed: int | None = None) -> list[list[bool]]:
+    """`synthetic_shootouts` as lists of kicks, cut off at their deciding kick."""
+    kicks, n_kicks = synthetic_shootouts(n_matches, seed)
+    return [row[:n].tolist() for row, n in zip(kicks, n_kicks)]
+
+
+def load_shootouts(csv_path: str) -> list[list[bool]]:
+    """Historical shootouts from a kick-level CSV with Game_id, Penalty_Number and Goal."""
+    import pandas as pd
+
+    df_kicks = pd.read_csv(csv_path)
+    df_kicks = df_kicks[df_kicks.Goal.notna()].sort_values(['Game_id', 'Penalty_Number'])
+    return [
+        game.Goal.astype(bool).tolist() for _, game in df_kicks.groupby('Game_id', sort=False)
+    ]
+
+
+def interleave_events(
+    shootouts: list[list[bool]], n_matches: int
+) -> list[live_service.KickEvent]:
+    """Run `n_matches` matches at once, cycling through the shootouts, one kick per match a turn."""
+    events = []
+    max_kicks = max(len(shootouts[match % len(shootouts)]) for match in range(n_matches))
+    for kick_index in range(max_kicks):
+        for match in range(n_matches):
+            kicks = shootouts[match % len(shootouts)]
+            if kick_index < len(kicks):
+                events.append(live_service.KickEvent(
+                    match_id=str(match), kick_success=kicks[kick_index]
+                ))
+    return events
+
+
+async def run_load(
+    events: list[live_service.KickEvent],
+    events_per_second: float | None = None,
+    max_pending_events: int = live_service.MAX_PENDING_EVENTS,
+) -> dict:
+    """Push the events through a fresh service and collect latency stats from one subscriber."""
+    service = live_service.LiveTrackingService(max_pending_events=max_pending_events)
+    subscription = service.subscribe(max_queue_size=len(events))
+    service_task = asyncio.create_task(service.run())
+
+    start = time.perf_counter()
+    for n_events, event in enumerate(events):
+        await live_service.wait_for_turn(start, n_events, events_per_second)
+        event.sent_at = time.perf_counter()
+        await service.submit(event)
+    await service.events.join()
+    elapsed = time.perf_counter() - start
+    service_task.cancel()
+
+    latencies_ms = []
+    while not subscription.updates.empty():
+        update = subscription.updates.get_nowait()
+        latencies_ms.append((update.processed_at - update.sent_at) * 1000)
+    percentiles = quantiles(latencies_ms, n=100)
+    return {
+        'n_events': len(events),
+        'events_per_second': len(events) / elapsed,
+        'p50_ms': percentiles[49],
+        'p99_ms': percentiles[98],
+        'max_ms': max(latencies_ms),
+        'n_dropped': subscription.n_dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-matches', type=int, default=10_000)
+    parser.add_argument(
+        '--events-per-second', type=float, default=None,
+        help="Pace the feed at this rate. Defaults to as fast as the service accepts events."
+    )
+    parser.add_argument('--csv', default=None, help="Replay historical shootouts from this CSV")
+    parser.add_argument('--max-pending-events', type=int, default=live_service.MAX_PENDING_EVENTS)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.csv:
+        shootouts = load_shootouts(args.csv)
+    else:
+        shootouts = generate_shootouts(args.n_matches, seed=args.seed)
+    events = interleave_events(shootouts, args.n_matches)
+
+    stats = asyncio.run(run_load(
+        events,
+        events_per_second=args.events_per_second,
+        max_pending_events=args.max_pending_events,
+    ))
+    print(
+        f"{stats['n_events']} events from {args.n_matches} concurrent matches at "
+        f"{stats['events_per_second']:,.0f} events/s: p50 {stats['p50_ms']:.3f} ms, "
+        f"p99 {stats['p99_ms']:.3f} ms, max {stats['max_ms']:.3f} ms, "
+        f"{stats['n_dropped']} updates dropped"
+    )
+
+
+if __name__ == "__main__":
+    main()
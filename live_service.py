@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+
+import model as probability_model
+import pk_shootout
+
+logger = logging.getLogger(__name__)
+MAX_PENDING_EVENTS = 10_000
+SUBSCRIBER_QUEUE_SIZE = 10_000
+YIELD_EVERY = 64  # events a feed submits back to back before letting the service catch up
+
+
+@dataclass(slots=True)
+class KickEvent:
+    """One kick in one match, as it arrives from the feed."""
+    match_id: str
+    kick_success: bool
+    sent_at: float = 0.0  # time.perf_counter() when the event reached this process
+    competition: str | None = None  # name in the model registry, None for the service's model
+
+    @classmethod
+    def from_json(cls, line: str | bytes) -> 'KickEvent':
+        """Parse an event off the feed, stamping `sent_at` with the time it was received.
+
+        `sent_at` is a `time.perf_counter()` value, which means nothing in another process, so
+        it isn't part of the wire format and latency is measured from when the event arrived.
+        """
+        event = json.loads(line)
+        return cls(
+            match_id=str(event['match_id']),
+            kick_success=bool(event['kick_success']),
+            sent_at=time.perf_counter(),
+            competition=event.get('competition'),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'match_id': self.match_id, 'kick_success': self.kick_success,
+            'competition': self.competition,
+        })
+
+
+@dataclass(slots=True)
+class ProbabilityUpdate:
+    """The state of a match after one of its kicks, pushed to every subscriber."""
+    match_id: str
+    n_kicks_attempted: int
+    team_1_score: int
+    team_2_score: int
+    team_1_probability: float
+    shootout_over: bool
+    sent_at: float
+    processed_at: float
+
+
+class Subscription:
+    """A bounded queue of updates for one subscriber.
+
+    If the subscriber falls behind, the oldest updates are dropped rather than stalling every
+    other match, so what it does read is never older than its queue.
+    """
+    def __init__(self, max_queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.updates = asyncio.Queue(maxsize=max_queue_size)
+        self.n_dropped = 0
+
+    def push(self, update: ProbabilityUpdate):
+        if self.updates.full():
+            self.updates.get_nowait()
+            self.n_dropped += 1
+        self.updates.put_nowait(update)
+
+    async def get(self) -> ProbabilityUpdate:
+        return await self.updates.get()
+
+
+class LiveTrackingService:
+    """Track many simultaneous shootouts from a stream of kick events.
+
+    Events are buffered in a bounded queue, so a feed that outpaces the service waits in
+    `submit` (backpressure) instead of growing memory. Each match gets its own `PKShootout`,
+    all borrowing the same shared model, and is dropped once its shootout is over. Events that
+    name a competition borrow that competition's model from the registry instead, loaded the
+    first time one of its matches starts. An event that can't be applied, e.g. one naming a
+    competition the registry doesn't know, is logged and counted in `n_events_rejected`, and
+    every other match carries on.
+    """
+    def __init__(
+        self,
+        probability_type: str = 'empirical',
+        max_pending_events: int = MAX_PENDING_EVENTS,
+        model: probability_model.ProbabilityModel | None = None,
+    ):
+        self.probability_type = probability_type
+        self.model = model or probability_model.load_model()
+        self.events = asyncio.Queue(maxsize=max_pending_events)
+        self.shootouts: dict[str, pk_shootout.PKShootout] = {}
+        self.subscriptions: list[Subscription] = []
+        self.n_events_processed = 0
+        self.n_events_rejected = 0
+
+    def subscribe(self, max_queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> Subscription:
+        subscription = Subscription(max_queue_size=max_queue_size)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.remove(subscription)
+
+    async def submit(self, event: KickEvent):
+        """Queue an event from the feed, waiting while the service is too far behind."""
+        await self.events.put(event)
+
+    def handle_event(self, event: KickEvent) -> ProbabilityUpdate:
+        """Apply one kick to its match and build the update for subscribers."""
+        pk = self.shootouts.get(event.match_id)
+        if pk is None:
+            # resolve the model before the match is tracked, so an unknown competition leaves
+            # nothing behind
+            model = (
+                probability_model.registry.get(event.competition) if event.competition
+                else self.model
+            )
+            pk = pk_shootout.PKShootout(probability_type=self.probability_type, model=model)
+            self.shootouts[event.match_id] = pk
+        pk.kick(kick_success=event.kick_success)
+
+        update = ProbabilityUpdate(
+            match_id=event.match_id,
+            n_kicks_attempted=pk.state.n_kicks_attempted,
+            team_1_score=pk.state.team_1_score,
+            team_2_score=pk.state.team_2_score,
+            team_1_probability=pk.team_1_probability,
+            shootout_over=pk.shootout_is_over,
+            sent_at=event.sent_at,
+            processed_at=time.perf_counter(),
+        )
+        # a finished match frees its slot, a later event with the same id starts a new shootout
+        if pk.shootout_is_over:
+            del self.shootouts[event.match_id]
+        return update
+
+    async def run(self):
+        """Process events until cancelled, pushing every update to every subscriber.
+
+        A bad event is rejected without stopping the loop, and every event is marked done so
+        `events.join()` and waiting producers never hang on it.
+        """
+        while True:
+            event = await self.events.get()
+            try:
+                update = self.handle_event(event)
+            except Exception:
+                self.n_events_rejected += 1
+                logger.exception("Rejected kick event for match %s", event.match_id)
+            else:
+                for subscription in self.subscriptions:
+                    subscription.push(update)
+                self.n_events_processed += 1
+            finally:
+                self.events.task_done()
+
+
+async def wait_for_turn(start: float, n_events: int, events_per_second: float | None):
+    """Pace a feed: wait until event number `n_events` is due at `events_per_second` from `start`.
+
+    A feed that has fallen behind schedule still gives the event loop back every `YIELD_EVERY`
+    events, so it doesn't starve the service. Unpaced feeds (None) never wait.
+    """
+    if not events_per_second:
+        return None
+    delay = start + n_events / events_per_second - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    elif n_events % YIELD_EVERY == 0:
+        await asyncio.sleep(0)
+
+
+async def replay_file_feed(
+    service: LiveTrackingService, file_path: str, events_per_second: float | None = None
+):
+    """Stand-in for a live feed: submit the JSON-lines kick events in a file, optionally paced."""
+    start = time.perf_counter()
+    with open(file_path) as f:
+        for n_events, line in enumerate(f):
+            if not line.strip():
+                continue
+            await wait_for_turn(start, n_events, events_per_second)
+            await service.submit(KickEvent.from_json(line))
+
+
+async def serve_socket_feed(
+    service: LiveTrackingService, host: str = '127.0.0.1', port: int = 8765
+) -> asyncio.Server:
+    """Stand-in for a live feed: accept JSON-lines kick events over a local TCP socket."""
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    await service.submit(KickEvent.from_json(line))
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
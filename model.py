@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import cached_property
+from os import path
+from types import MappingProxyType
+from typing import Mapping
+
+import numpy as np
+
+from data import binary_format
+import instrumentation
+import solver
+
+MODEL_PATH = path.join(path.dirname(path.abspath(__file__)), 'data', 'probability_dict.json')
+BINARY_MODEL_PATH = path.join(
+    path.dirname(path.abspath(__file__)), 'data', 'probability_table.bin'
+)
+# one table per competition and era, e.g. data/models/euros/2010s.bin for 'euros/2010s'
+MODELS_DIR = path.join(path.dirname(path.abspath(__file__)), 'data', 'models')
+DEFAULT_MODEL_NAME = 'world_cup'
+MAX_RESIDENT_MODELS = 8
+
+_model_cache: dict[str, 'ProbabilityModel'] = {}
+_model_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True, eq=False)
+class ProbabilityModel:
+    """A loaded probability table, shared read-only by every `PKShootout` that uses it.
+
+    The dense arrays are indexed by (kicks_attempted, team_1_score, team_2_score). `ci_lower` and
+    `ci_upper` bound the bootstrap confidence interval of each state's historical win rate, NaN
+    where the table has none.
+    `compiled_tables` memoizes the tables each `PKShootout` configuration compiles from the
+    counts, so only the first shootout with a given configuration pays for compiling them.
+    """
+    file_path: str
+    mtime_ns: int
+    win_probabilities: np.ndarray
+    state_wins: np.ndarray
+    state_totals: np.ndarray
+    ci_lower: np.ndarray
+    ci_upper: np.ndarray
+    compiled_tables: dict = field(default_factory=dict, repr=False)
+
+    @cached_property
+    def game_probability_dict(self) -> Mapping[str, Mapping]:
+        """The table in the `probability_dict.json` layout, for states that have a probability or
+        counts."""
+        game_probability_dict = {}
+        for n_kicks_attempted, team_1_score, team_2_score in np.argwhere(
+            ~np.isnan(self.win_probabilities) | (self.state_totals > 0)
+        ).tolist():
+            state = (n_kicks_attempted, team_1_score, team_2_score)
+            win_probability = float(self.win_probabilities[state])
+            ci_lower, ci_upper = float(self.ci_lower[state]), float(self.ci_upper[state])
+            game_probability_dict[f"{n_kicks_attempted}_{team_1_score}_{team_2_score}"] = (
+                MappingProxyType({
+                    'n_kicks_attempted': n_kicks_attempted,
+                    'team_1_score': team_1_score,
+                    'team_2_score': team_2_score,
+                    'win_probability': None if np.isnan(win_probability) else win_probability,
+                    'wins': int(self.state_wins[state]),
+                    'n_shootouts': int(self.state_totals[state]),
+                    'ci_lower': None if np.isnan(ci_lower) else ci_lower,
+                    'ci_upper': None if np.isnan(ci_upper) else ci_upper,
+                })
+            )
+        return MappingProxyType(game_probability_dict)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def default_model_path() -> str:
+    """The binary table shipped with the package if there is one, otherwise the JSON table."""
+    return BINARY_MODEL_PATH if path.exists(BINARY_MODEL_PATH) else MODEL_PATH
+
+
+def read_model(file_path: str = MODEL_PATH) -> ProbabilityModel:
+    """Read a probability table from disk, bypassing the cache.
+
+    `.bin` tables written by `data/binary_format.py` are memory-mapped without parsing, anything
+    else is read as `probability_dict.json`.
+    """
+    file_path = path.abspath(file_path)
+    mtime_ns = os.stat(file_path).st_mtime_ns
+    if file_path.endswith('.bin'):
+        arrays = binary_format.read_arrays(file_path)
+        # tables written before intervals were stored don't have them
+        no_intervals = _read_only(np.full(arrays['win_probability'].shape, np.nan))
+        return ProbabilityModel(
+            file_path=file_path,
+            mtime_ns=mtime_ns,
+            win_probabilities=arrays['win_probability'],
+            state_wins=arrays['wins'],
+            state_totals=arrays['n_shootouts'],
+            ci_lower=arrays.get('ci_lower', no_intervals),
+            ci_upper=arrays.get('ci_upper', no_intervals),
+        )
+
+    with open(file_path) as f:
+        game_probability_dict = json.load(f)
+    state_wins, state_totals = solver.state_counts_from_dict(game_probability_dict)
+    ci_lower, ci_upper = solver.intervals_from_dict(game_probability_dict)
+    return ProbabilityModel(
+        file_path=file_path,
+        mtime_ns=mtime_ns,
+        win_probabilities=_read_only(solver.empirical_table_from_dict(game_probability_dict)),
+        state_wins=_read_only(state_wins),
+        state_totals=_read_only(state_totals),
+        ci_lower=_read_only(ci_lower),
+        ci_upper=_read_only(ci_upper),
+    )
+
+
+def load_model(file_path: str | None = None) -> ProbabilityModel:
+    """Get the shared model for a probability table, loading it at most once per process.
+
+    Relative paths resolve against the current directory, the default (`default_model_path`)
+    resolves against this package. The cached model is reloaded if the file has been modified
+    since it was read.
+    """
+    file_path = path.abspath(file_path or default_model_path())
+    recorder = instrumentation.recorder
+    with _model_cache_lock:
+        model = _model_cache.get(file_path)
+        if model is None or model.mtime_ns != os.stat(file_path).st_mtime_ns:
+            with recorder.timer('model_load_seconds') if recorder is not None else nullcontext():
+                model = read_model(file_path)
+            _model_cache[file_path] = model
+            if recorder is not None:
+                recorder.count('model_cache.miss')
+        elif recorder is not None:
+            recorder.count('model_cache.hit')
+    return model
+
+
+def clear_model_cache():
+    with _model_cache_lock:
+        _model_cache.clear()
+
+
+class ModelRegistry:
+    """Probability tables for many competitions, loaded on first use and evicted when idle.
+
+    Tables are named by competition and era, e.g. 'euros' or 'euros/2010s', with
+    `DEFAULT_MODEL_NAME` for the shipped World Cup table. A name resolves to the path it was
+    registered with, otherwise to `<models_dir>/<name>.bin` or `.json`. At most
+    `max_resident` models are kept loaded, dropping the least recently used one when another is
+    loaded. Shootouts already using an evicted model keep it until they are done with it.
+    """
+    def __init__(self, models_dir: str = MODELS_DIR, max_resident: int = MAX_RESIDENT_MODELS):
+        assert max_resident > 0, "The registry has to keep at least one model"
+        self.models_dir = models_dir
+        self.max_resident = max_resident
+        # the World Cup table shipped with the package
+        self.file_paths: dict[str, str] = {DEFAULT_MODEL_NAME: default_model_path()}
+        self.models: OrderedDict[str, ProbabilityModel] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def register(self, name: str, file_path: str):
+        """Serve `name` from a table at `file_path`, replacing whatever it was loaded from."""
+        with self.lock:
+            self.file_paths[name] = path.abspath(file_path)
+            self.models.pop(name, None)
+
+    def file_path(self, name: str) -> str:
+        if name in self.file_paths:
+            return self.file_paths[name]
+        for extension in ('.bin', '.json'):
+            file_path = path.join(self.models_dir, *name.split('/')) + extension
+            if path.exists(file_path):
+                return file_path
+        raise KeyError(f"No probability table registered or in {self.models_dir} for {name!r}")
+
+    def names(self) -> list[str]:
+        """Every registered name and every table under `models_dir`, loaded or not."""
+        names = set(self.file_paths)
+        for directory, _, file_names in os.walk(self.models_dir):
+            for file_name in file_names:
+                stem, extension = path.splitext(file_name)
+                if extension in ('.bin', '.json'):
+                    relative_dir = path.relpath(directory, self.models_dir)
+                    names.add(stem if relative_dir == '.' else f"{relative_dir}/{stem}")
+        return sorted(name.replace(os.sep, '/') for name in names)
+
+    def get(self, name: str) -> ProbabilityModel:
+        """Get the model for `name`, loading it if it isn't resident or its file has changed."""
+        recorder = instrumentation.recorder
+        with self.lock:
+            file_path = self.file_path(name)
+            model = self.models.get(name)
+            if model is not None and model.mtime_ns == os.stat(file_path).st_mtime_ns:
+                self.models.move_to_end(name)
+                if recorder is not None:
+                    recorder.count('model_registry.hit')
+                return model
+
+            with recorder.timer('model_load_seconds') if recorder is not None else nullcontext():
+                model = read_model(file_path)
+            self.models[name] = model
+            self.models.move_to_end(name)
+            if len(self.models) > self.max_resident:
+                self.models.popitem(last=False)
+                if recorder is not None:
+                    recorder.count('model_registry.eviction')
+            if recorder is not None:
+                recorder.count('model_registry.miss')
+            return model
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+
+registry = ModelRegistry()
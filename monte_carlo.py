@@ -0,0 +1,186 @@
+import argparse
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from data import parallel, team
+import solver
+
+SINGLE_KICK_PROB = solver.SINGLE_KICK_PROB
+KICKS_PER_TEAM = solver.MAX_KICKS // 2
+SUDDEN_DEATH_BLOCK = 8  # sudden-death rounds sampled at a time for shootouts still tied
+
+
+class MonteCarloResult(NamedTuple):
+    """Outcome distribution of a batch of simulated shootouts."""
+    n_shootouts: int
+    team_1_wins: int
+    deciding_kick_counts: np.ndarray  # index is the 1-based kick that decided the shootout
+    final_score_counts: np.ndarray  # indexed by (team_1_score, team_2_score)
+
+    @property
+    def team_1_win_probability(self) -> float:
+        return self.team_1_wins / self.n_shootouts
+
+    def combine(self, other: 'MonteCarloResult') -> 'MonteCarloResult':
+        """Add the counts from another batch, padding the arrays to the longer shootouts."""
+        deciding_kick_counts = np.zeros(
+            max(len(self.deciding_kick_counts), len(other.deciding_kick_counts)), dtype=np.int64
+        )
+        deciding_kick_counts[:len(self.deciding_kick_counts)] += self.deciding_kick_counts
+        deciding_kick_counts[:len(other.deciding_kick_counts)] += other.deciding_kick_counts
+
+        n_goals = max(len(self.final_score_counts), len(other.final_score_counts))
+        final_score_counts = np.zeros((n_goals, n_goals), dtype=np.int64)
+        for counts in (self.final_score_counts, other.final_score_counts):
+            final_score_counts[:len(counts), :len(counts)] += counts
+
+        return MonteCarloResult(
+            n_shootouts=self.n_shootouts + other.n_shootouts,
+            team_1_wins=self.team_1_wins + other.team_1_wins,
+            deciding_kick_counts=deciding_kick_counts,
+            final_score_counts=final_score_counts,
+        )
+
+
+def simulate_chunk(
+    n_shootouts: int,
+    team_1_rates: float | Sequence[float],
+    team_2_rates: float | Sequence[float],
+    seed: np.random.SeedSequence | int | None = None,
+    kicking_order: team.KickingOrder | str = solver.ABAB,
+) -> MonteCarloResult:
+    """Simulate a batch of shootouts in one process with vectorized sampling.
+
+    Regulation kicks follow `kicking_order` and stop as soon as a team has clinched, following
+    `solver.is_state_over`. Shootouts still tied after 10 kicks go to sudden-death rounds until
+    one team makes and the other misses, every kick at the team's `solver.sudden_death_rate` like
+    the solver. Who kicks first in a round doesn't change how it ends, so the rounds are sampled
+    the same way in every kicking order.
+    """
+    rng = np.random.default_rng(seed)
+
+    # sample all regulation kicks and interleave them in kicking order
+    team_1_kicked = solver.team_1_kicked(np.arange(1, solver.MAX_KICKS + 1), kicking_order)
+    kicks = np.empty((n_shootouts, solver.MAX_KICKS), dtype=bool)
+    team_1_makes = rng.random((n_shootouts, KICKS_PER_TEAM)) < solver.team_kick_rates(
+        team_1_rates, KICKS_PER_TEAM
+    )
+    team_2_makes = rng.random((n_shootouts, KICKS_PER_TEAM)) < solver.team_kick_rates(
+        team_2_rates, KICKS_PER_TEAM
+    )
+    kicks[:, team_1_kicked] = team_1_makes
+    kicks[:, ~team_1_kicked] = team_2_makes
+    team_1_score = np.cumsum(kicks & team_1_kicked, axis=1)
+    team_2_score = np.cumsum(kicks & ~team_1_kicked, axis=1)
+
+    # find the kick that clinched each shootout and take the score at that point
+    clinched = solver.over_states(kicking_order)[
+        np.arange(1, solver.MAX_KICKS + 1), team_1_score, team_2_score
+    ]
+    deciding_index = np.where(clinched.any(axis=1), clinched.argmax(axis=1), solver.MAX_KICKS - 1)
+    team_1_final = np.take_along_axis(team_1_score, deciding_index[:, None], axis=1)[:, 0]
+    team_2_final = np.take_along_axis(team_2_score, deciding_index[:, None], axis=1)[:, 0]
+    deciding_kick = deciding_index + 1
+
+    # play sudden-death rounds for the shootouts that are still tied
+    team_1_sudden_death_rate = solver.sudden_death_rate(team_1_rates)
+    team_2_sudden_death_rate = solver.sudden_death_rate(team_2_rates)
+    tied = np.flatnonzero(team_1_final == team_2_final)
+    n_rounds_played = 0
+    while len(tied) > 0:
+        team_1_makes = rng.random((len(tied), SUDDEN_DEATH_BLOCK)) < team_1_sudden_death_rate
+        team_2_makes = rng.random((len(tied), SUDDEN_DEATH_BLOCK)) < team_2_sudden_death_rate
+
+        # a round is decided when one team makes and the other misses
+        decided = team_1_makes != team_2_makes
+        is_decided = decided.any(axis=1)
+        deciding_round = decided.argmax(axis=1)
+
+        done = tied[is_decided]
+        rounds = deciding_round[is_decided]
+        # rounds before the deciding one were level, either both teams scored or both missed
+        both_scored = team_1_makes[is_decided] & team_2_makes[is_decided]
+        goals_before = (both_scored & (np.arange(SUDDEN_DEATH_BLOCK) < rounds[:, None])).sum(axis=1)
+        team_1_final[done] += goals_before + team_1_makes[is_decided, rounds]
+        team_2_final[done] += goals_before + team_2_makes[is_decided, rounds]
+        deciding_kick[done] = solver.MAX_KICKS + 2 * (n_rounds_played + rounds + 1)
+
+        # shootouts still tied carry every goal from this block into the next one
+        still_tied = tied[~is_decided]
+        goals_in_block = (team_1_makes[~is_decided] & team_2_makes[~is_decided]).sum(axis=1)
+        team_1_final[still_tied] += goals_in_block
+        team_2_final[still_tied] += goals_in_block
+        tied = still_tied
+        n_rounds_played += SUDDEN_DEATH_BLOCK
+
+    n_goals = int(max(team_1_final.max(), team_2_final.max())) + 1
+    final_score_counts = np.zeros((n_goals, n_goals), dtype=np.int64)
+    np.add.at(final_score_counts, (team_1_final, team_2_final), 1)
+
+    return MonteCarloResult(
+        n_shootouts=n_shootouts,
+        team_1_wins=int((team_1_final > team_2_final).sum()),
+        deciding_kick_counts=np.bincount(deciding_kick),
+        final_score_counts=final_score_counts,
+    )
+
+
+def run_monte_carlo(
+    n_shootouts: int,
+    team_1_rates: float | Sequence[float] = SINGLE_KICK_PROB,
+    team_2_rates: float | Sequence[float] = SINGLE_KICK_PROB,
+    seed: int | None = None,
+    n_workers: int | None = None,
+    chunk_size: int = 1_000_000,
+    kicking_order: team.KickingOrder | str = solver.ABAB,
+) -> MonteCarloResult:
+    """Simulate `n_shootouts` shootouts in seeded chunks, see `parallel.seeded_chunks`, fanned
+    out over `n_workers` processes."""
+    chunk_sizes, chunk_seeds = parallel.seeded_chunks(n_shootouts, chunk_size, seed)
+    results = parallel.map_chunks(
+        simulate_chunk,
+        chunk_sizes,
+        [team_1_rates] * len(chunk_sizes),
+        [team_2_rates] * len(chunk_sizes),
+        chunk_seeds,
+        [kicking_order] * len(chunk_sizes),
+        n_workers=n_workers,
+    )
+
+    combined = results[0]
+    for result in results[1:]:
+        combined = combined.combine(result)
+    return combined
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of PK shootouts")
+    parser.add_argument('--n-shootouts', type=int, default=10_000_000)
+    parser.add_argument('--team-1-rates', type=float, nargs='+', default=[SINGLE_KICK_PROB])
+    parser.add_argument('--team-2-rates', type=float, nargs='+', default=[SINGLE_KICK_PROB])
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--n-workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument(
+        '--kicking-order', default=solver.ABAB, help="Repeating kicking order, e.g. AB or ABBA"
+    )
+    args = parser.parse_args()
+
+    result = run_monte_carlo(
+        n_shootouts=args.n_shootouts,
+        team_1_rates=args.team_1_rates,
+        team_2_rates=args.team_2_rates,
+        seed=args.seed,
+        n_workers=args.n_workers,
+        chunk_size=args.chunk_size,
+        kicking_order=args.kicking_order,
+    )
+    print(f"Team 1 win probability: {result.team_1_win_probability:.4%}")
+    for kick, count in enumerate(result.deciding_kick_counts):
+        if count:
+            print(f"Decided on kick {kick}: {count / result.n_shootouts:.4%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,645 @@
-import json
-from os import path
-import pandas as pd
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Sequence
+
+import numpy as np
 
 from data import team
+import instrumentation
+import model as probability_model
+from shootout_state import ShootoutState
+import solver
 
 kt = team.KickingTeam
-SINGLE_KICK_PROB = 0.690625  # based on historic data
+SINGLE_KICK_PROB = solver.SINGLE_KICK_PROB
+MAX_KICKS = solver.MAX_KICKS
+MAX_SCORE = solver.MAX_SCORE
+PRIOR_STRENGTH = 2.0  # how many shootouts the simulated prior is worth for each state
+OUTCOME_TREE_KICKS = 4
+FINAL_SCORE_TOLERANCE = 1e-12  # stop following sudden death once this little is left undecided
+MAX_SUDDEN_DEATH_ROUNDS = 100
+TRAJECTORY_MASK = (1 << MAX_KICKS) - 1  # the outcome bits of the regulation kicks
+
+
+class BatchReplay(NamedTuple):
+    """Kick-by-kick results of replaying many shootouts, one row per shootout."""
+    team_1_score: np.ndarray
+    team_2_score: np.ndarray
+    shootout_over: np.ndarray
+    deciding_kick: np.ndarray
+    team_1_probability: np.ndarray
+
+
+class TrajectoryIndex(NamedTuple):
+    """The trajectory of every regulation shootout, one row per outcome bitmask.
+
+    Row `outcomes` is the shootout whose kick i + 1 was scored if bit i is set, the same bitmask
+    as `ShootoutState.outcomes`. A shootout's first n kicks only depend on the first n bits, so
+    any prefix reads its trajectory off the first n columns of its own row. Columns after the
+    deciding kick repeat its values, like `BatchReplay`. `winner` is 1 or 2, or 0 for shootouts
+    still tied after kick 10.
+    """
+    team_1_score: np.ndarray
+    team_2_score: np.ndarray
+    team_1_probability: np.ndarray
+    deciding_kick: np.ndarray
+    winner: np.ndarray
+
+    def lookup(self, state: ShootoutState) -> dict[str, np.ndarray]:
+        """The scores and probabilities after each regulation kick taken so far in `state`."""
+        n_kicks = min(state.n_kicks_attempted, MAX_KICKS)
+        outcomes = state.outcomes & TRAJECTORY_MASK
+        return {
+            'team_1_score': self.team_1_score[outcomes, :n_kicks],
+            'team_2_score': self.team_2_score[outcomes, :n_kicks],
+            'team_1_probability': self.team_1_probability[outcomes, :n_kicks],
+        }
+
+
+class OutcomeNode(NamedTuple):
+    """A score reachable within the next few kicks and how likely it is."""
+    n_kicks_attempted: int
+    team_1_score: int
+    team_2_score: int
+    reach_probability: float
+    team_1_probability: float
+    shootout_over: bool
+
+
+class OutcomeTree(NamedTuple):
+    """Every make/miss path over the next kicks from one score, with paths that reach the same
+    score merged into one node.
+
+    `levels[i]` holds the nodes after the next i + 1 kicks keyed by (team_1_score, team_2_score).
+    `end_probability[i]` is the chance the shootout is clinched on exactly the next i + 1th kick,
+    and `final_scores` the chance of every final score, all the way through sudden death.
+    """
+    n_kicks_attempted: int
+    team_1_score: int
+    team_2_score: int
+    levels: tuple[dict[tuple[int, int], OutcomeNode], ...]
+    end_probability: np.ndarray
+    final_scores: dict[tuple[int, int], float]
+    kicking_order: str = solver.ABAB
+
+    def node(self, kicks: Sequence[bool]) -> OutcomeNode | None:
+        """Get the node a path of next kicks leads to, or None if the path is longer than the
+        tree or goes on after the shootout is clinched."""
+        if not 0 < len(kicks) <= len(self.levels):
+            return None
+        team_1_score, team_2_score = self.team_1_score, self.team_2_score
+        for kick_index, kick_success in enumerate(kicks):
+            if solver.team_1_kicked(self.n_kicks_attempted + kick_index + 1, self.kicking_order):
+                team_1_score += int(kick_success)
+            else:
+                team_2_score += int(kick_success)
+            node = self.levels[kick_index].get((team_1_score, team_2_score))
+            if node is None or (node.shootout_over and kick_index < len(kicks) - 1):
+                return None
+        return node
 
 
 class PKShootout:
-    def __init__(self, probability_type: str = 'empirical'):
+    def __init__(
+        self,
+        probability_type: str = 'empirical',
+        prior_strength: float = PRIOR_STRENGTH,
+        model: probability_model.ProbabilityModel | str | None = None,
+        kicking_order: team.KickingOrder | str = team.KickingOrder.abab,
+        single_kick_prob: float = SINGLE_KICK_PROB,
+    ):
+        """`model` is a loaded model, the name of one in `probability_model.registry` such as
+        'euros/2010s', or None for the World Cup table shipped with the package.
+
+        `kicking_order` is ABAB, ABBA or any pattern `team.kicking_pattern` accepts. The model's
+        history should come from shootouts in the same order, the World Cup table is ABAB.
+
+        `single_kick_prob` is the conversion rate behind the simulated prior, the scores with no
+        history and sudden death, the historic rate by default."""
         assert probability_type in ['empirical', 'simulated']
+        assert prior_strength >= 0, "The prior strength can't be negative"
+        assert 0 < single_kick_prob < 1, "The conversion rate must be a probability"
         self.probability_type = probability_type
-        self.n_kicks_attempted = 0
+        self.prior_strength = prior_strength
+        self.single_kick_prob = single_kick_prob
+        self.kicking_order = team.kicking_pattern(kicking_order)
+        # sudden-death tables repeat with the kicking order, see `solver.sudden_death_probabilities`
+        self.kicking_period = len(self.kicking_order)
+        # the state is all a shootout keeps per kick, the progress dicts are built from it
+        self.state = ShootoutState(kicking_order=self.kicking_order)
         self.shootout_is_over = False
-        self.shootout_team_progress = {
+        self.team_1_probability = 0.5
+        self.team_2_probability = 0.5
+        self.over_states = solver.over_states(self.kicking_order)
+
+        # borrow the process-wide model and any tables already compiled for this configuration
+        if isinstance(model, str):
+            model = probability_model.registry.get(model)
+        self.model = model or probability_model.load_model()
+        self.game_probability_dict = self.model.game_probability_dict
+        self.state_wins = self.model.state_wins
+        self.state_totals = self.model.state_totals
+        tables_key = (
+            self.probability_type, self.prior_strength, self.kicking_order, self.single_kick_prob
+        )
+        recorder = instrumentation.recorder
+        if recorder is not None:
+            recorder.count(
+                'compiled_tables.hit' if tables_key in self.model.compiled_tables
+                else 'compiled_tables.miss'
+            )
+        if tables_key not in self.model.compiled_tables:
+            self.compile_tables()
+            self.model.compiled_tables[tables_key] = (
+                self.empirical_table,
+                self.shrunk_states,
+                self.probability_table,
+                self.sudden_death_table,
+            )
+        (
+            self.empirical_table,
+            self.shrunk_states,
+            self.probability_table,
+            self.sudden_death_table,
+        ) = self.model.compiled_tables[tables_key]
+        # the key of the shared tables in use, None once this shootout compiles its own
+        self.tables_key = tables_key
+        self.simulated_tables = OrderedDict()
+        self.outcome_trees = {}
+        self.trajectories = None
+        # custom kick rates from `set_kick_rates` and their solved tables, None for the history
+        self.kick_probs = None
+        self.rate_tables = None
+
+    def compile_tables(self):
+        """Derive the empirical probabilities from the state counts and compile every table."""
+        # solved tables from `simulate_win_probability`, keyed by the per-kick conversion rates
+        self.simulated_tables = OrderedDict()
+        # trees from `outcome_tree`, keyed by score, depth and the per-kick conversion rates
+        self.outcome_trees = {}
+        # every regulation trajectory from `trajectory_index`, built on first use
+        self.trajectories = None
+        self.tables_key = None
+        self.empirical_table, self.shrunk_states = self.build_empirical_table()
+        # compile every reachable state once so a kick is a single array read
+        self.probability_table = self.build_probability_table()
+        self.sudden_death_table = self.build_sudden_death_table()
+        for table in (
+            self.empirical_table,
+            self.shrunk_states,
+            self.probability_table,
+            self.sudden_death_table,
+        ):
+            table.flags.writeable = False
+
+    def record_shootout(self, kicks: Sequence[bool] | None = None):
+        """Fold a finished shootout into the state counts and recompile the tables.
+
+        Defaults to the kicks of this shootout. Only the states the shootout passed through are
+        updated, so this costs the same however many shootouts are already counted. The shared
+        model is left untouched, this shootout switches to its own copy of the counts.
+
+        Raises ValueError for tables that only store probabilities, like the World Cup table
+        shipped with the package. Their history has no counts to add a shootout to, so every
+        state it passed through would drop its history for a one-shootout estimate. Rebuild the
+        table with `data/create_pk_data_dict.py` to get the counts.
+        """
+        if not self.state_totals.any() and not np.isnan(self.model.win_probabilities).all():
+            raise ValueError(
+                f"{self.model.file_path} has win probabilities but no state counts to record a "
+                "shootout into, rebuild it with data/create_pk_data_dict.py"
+            )
+        kicks = self.state.kicks if kicks is None else kicks
+        self.state_wins = self.state_wins.copy()
+        self.state_totals = self.state_totals.copy()
+        solver.record_shootout(self.state_wins, self.state_totals, kicks, self.kicking_order)
+        self.compile_tables()
+
+    def set_kick_rates(self, kick_probs: float | Sequence[float] | None = None):
+        """Use custom conversion rates for the win probabilities, or None to go back to history.
+
+        Takes anything `solver.kick_probabilities` does, e.g. one rate per kick slot, or the
+        per-team, per-kicker and goalkeeper-adjusted rates from `solver.lineup_kick_probabilities`.
+        The history is for average teams, so with custom rates every probability is solved from
+        the rates alone. Solved tables are shared in an LRU cache, so switching back to rates
+        that were used recently is instant. The current probabilities update straight away.
+        """
+        if kick_probs is None:
+            self.kick_probs = None
+            self.rate_tables = None
+        else:
+            self.kick_probs = solver.kick_probabilities(kick_probs, self.kicking_order)
+            self.rate_tables = solver.rate_tables(tuple(self.kick_probs), self.kicking_order)
+        self.outcome_trees = {}
+        self.trajectories = None
+        self.update_probabilities()
+
+    def win_probability_interval(self) -> tuple[float, float] | None:
+        """Get the bootstrap confidence interval of team 1's win probability at the current score.
+
+        The interval is for the historical win rate of the score, from resampling the shootouts
+        the table was built from, so it shows how little history some probabilities rest on.
+        It isn't shrunk or clamped like the point probability. None where there is no history to
+        resample: before the first kick, in sudden death, for scores never reached, with custom
+        kick rates, or for tables built without intervals.
+        """
+        n_kicks_attempted = self.state.n_kicks_attempted
+        if self.rate_tables is not None or not 0 < n_kicks_attempted < MAX_KICKS:
+            return None
+        state = (n_kicks_attempted, self.state.team_1_score, self.state.team_2_score)
+        lower, upper = float(self.model.ci_lower[state]), float(self.model.ci_upper[state])
+        if np.isnan(lower):
+            return None
+        # the intervals are for the team that just kicked
+        if solver.team_1_kicked(n_kicks_attempted, self.kicking_order):
+            return lower, upper
+        return 1 - upper, 1 - lower
+
+    @property
+    def n_kicks_attempted(self) -> int:
+        return self.state.n_kicks_attempted
+
+    @property
+    def kicking_team(self) -> team.KickingTeam:
+        """The team that takes the next kick, always the other team in ABAB but not in every
+        kicking order."""
+        return kt.team_1 if self.state.team_1_kicks_next else kt.team_2
+
+    @property
+    def shootout_team_progress(self) -> dict[str, dict]:
+        """Each team's kicks, score and current win probability, built from `state`."""
+        n_kicks_attempted = self.state.n_kicks_attempted
+        kicks_allotted = solver.kicks_allotted(n_kicks_attempted)
+        team_1_kicks = int(solver.team_1_kicks_taken(n_kicks_attempted, self.kicking_order))
+        team_2_kicks = n_kicks_attempted - team_1_kicks
+        return {
             kt.team_1.value: {
-                'kicks_attempted': 0,
-                'kicks_remaining': 5,
-                'score': 0,
-                'probability': 0.5,
+                'kicks_attempted': team_1_kicks,
+                'kicks_remaining': kicks_allotted - team_1_kicks,
+                'score': self.state.team_1_score,
+                'probability': self.team_1_probability,
             },
             kt.team_2.value: {
-                'kicks_attempted': 0,
-                'kicks_remaining': 5,
-                'score': 0,
-                'probability': 0.5,
+                'kicks_attempted': team_2_kicks,
+                'kicks_remaining': kicks_allotted - team_2_kicks,
+                'score': self.state.team_2_score,
+                'probability': self.team_2_probability,
             },
         }
-        self.kicking_team = kt.team_1
-
-        self.shootout_progress = {
-            'kick': list(range(1, 11)),
-            'kicks': [],
-            'team_1_score': [],
-            'team_2_score': [],
-            'team_1_probability': [],
-            'team_2_probability': [],
+
+    @property
+    def shootout_progress(self) -> dict[str, list]:
+        """The kicks so far and the scores and probabilities after each one, built from `state`.
+
+        The probabilities are read off the tables in use in one vectorized lookup, with the same
+        arithmetic as `kick`, so the last entries match the current probabilities. `kick` runs
+        from 1 to 10, then on through sudden death.
+        """
+        kicks = np.array(self.state.kicks, dtype=bool)
+        n_kicks = np.arange(1, len(kicks) + 1)
+        team_1_kicked = solver.team_1_kicked(n_kicks, self.kicking_order)
+        team_1_score = np.cumsum(kicks & team_1_kicked)
+        team_2_score = np.cumsum(kicks & ~team_1_kicked)
+        probability_table, sudden_death_table = self.active_tables()
+        regulation = n_kicks <= MAX_KICKS
+        kick_team_prob = np.empty(len(kicks))
+        kick_team_prob[regulation] = probability_table[
+            n_kicks[regulation], team_1_score[regulation], team_2_score[regulation]
+        ]
+        kick_team_prob[~regulation] = sudden_death_table[
+            n_kicks[~regulation] % self.kicking_period,
+            team_1_score[~regulation] - team_2_score[~regulation] + 1,
+        ]
+        return {
+            'kick': list(range(1, max(MAX_KICKS, len(kicks)) + 1)),
+            'kicks': kicks.tolist(),
+            'team_1_score': team_1_score.tolist(),
+            'team_2_score': team_2_score.tolist(),
+            'team_1_probability': np.where(
+                team_1_kicked, kick_team_prob, 1 - kick_team_prob
+            ).tolist(),
+            'team_2_probability': np.where(
+                team_1_kicked, 1 - kick_team_prob, kick_team_prob
+            ).tolist(),
         }
 
-        with open(path.join('data', 'probability_dict.json')) as f:
-            self.game_probability_dict = json.load(f)
+    def update_probabilities(self):
+        """Set both teams' current win probability from the tables."""
+        state = self.state
+        if state.n_kicks_attempted == 0 and self.rate_tables is None:
+            # the history has no probability before the first kick
+            self.team_1_probability, self.team_2_probability = 0.5, 0.5
+            return None
+        kick_team_prob = self.lookup_win_probability(
+            n_kicks_attempted=state.n_kicks_attempted,
+            team_1_score=state.team_1_score,
+            team_2_score=state.team_2_score,
+        )
+        # kick 0 counts as team 2 having just kicked
+        if solver.team_1_kicked(state.n_kicks_attempted, self.kicking_order):
+            self.team_1_probability, self.team_2_probability = kick_team_prob, 1 - kick_team_prob
+        else:
+            self.team_1_probability, self.team_2_probability = 1 - kick_team_prob, kick_team_prob
 
     def kick(self, kick_success: bool = True):
-        """A team kicks. Update the counts, scores, probabilities and check if the game is over."""
-        if self.shootout_is_over or self.n_kicks_attempted >= 10:
+        """A team kicks. Update the state and probabilities and check if the game is over."""
+        if self.shootout_is_over:
             return None
 
-        kick_success_int = int(kick_success)
-        self.n_kicks_attempted += 1
-        self.shootout_progress['kicks'].append(kick_success)
-        
-        # update counts for the kicking team
-        self.shootout_team_progress[self.kicking_team.value]['kicks_attempted'] += 1
-        self.shootout_team_progress[self.kicking_team.value]['kicks_remaining'] -= 1
-        self.shootout_team_progress[self.kicking_team.value]['score'] += kick_success_int
-        
-        # first check if the shootout has been won
-        self.shootout_is_over, _ = self.is_shootout_over(
-            n_kicks_attempted=self.n_kicks_attempted,
-            team_1_score=self.shootout_team_progress[kt.team_1.value]['score'],
-            team_2_score=self.shootout_team_progress[kt.team_2.value]['score'],
-        )
-        # then calculate the probablity for the team ahead
-        kick_team_prob = self.calc_win_probability_after_kick(
-            team_kicking=self.kicking_team,
-            kick_success=kick_success,
-            shootout_over=self.shootout_is_over
+        recorder = instrumentation.recorder
+        if recorder is not None:
+            start = time.perf_counter()
+        state = self.state = self.state.after_kick(kick_success)
+        if state.n_kicks_attempted <= MAX_KICKS:
+            self.shootout_is_over = bool(
+                self.over_states[state.n_kicks_attempted, state.team_1_score, state.team_2_score]
+            )
+        else:
+            self.shootout_is_over = state.is_over
+        # look up the probablity for the team that just kicked
+        self.update_probabilities()
+        if recorder is not None:
+            recorder.count('kicks')
+            recorder.observe('kick_seconds', time.perf_counter() - start)
+
+    def undo_last_kick(self):
+        """Take back the last kick, e.g. if it was entered wrong, without replaying the rest."""
+        if self.state.n_kicks_attempted == 0:
+            return None
+        self.state = self.state.before_last_kick()
+        # the shootout was still going before its last kick
+        self.shootout_is_over = False
+        self.update_probabilities()
+
+    def snapshot(self) -> ShootoutState:
+        """Get the current state. It is immutable, so it stays valid however the shootout goes."""
+        return self.state
+
+    def restore(self, state: ShootoutState):
+        """Go back (or forward) to a state from `snapshot`.
+
+        The state is all a shootout keeps, so this is one table lookup however many kicks it has.
+        """
+        assert state.kicking_order == self.kicking_order, "The state is for another kicking order"
+        self.state = state
+        self.shootout_is_over = state.is_over
+        self.update_probabilities()
+
+    def trajectory_index(self) -> TrajectoryIndex:
+        """Get the trajectory of every make/miss sequence of the 10 regulation kicks.
+
+        All 2^10 sequences are replayed in one `replay_shootouts` pass, including the ones that
+        end early, so the rows stay a plain bitmask lookup. The index for the shared tables is
+        kept with them in `model.compiled_tables`, so it is built once per configuration for
+        every shootout. After `record_shootout` or `set_kick_rates` this shootout builds its own.
+        """
+        if self.trajectories is None and self.rate_tables is None and self.tables_key is not None:
+            self.trajectories = self.model.compiled_tables.get((*self.tables_key, 'trajectories'))
+        if self.trajectories is None:
+            outcomes = np.arange(1 << MAX_KICKS)
+            replay = self.replay_shootouts(outcomes[:, None] >> np.arange(MAX_KICKS) & 1)
+            team_1_final = replay.team_1_score[:, -1]
+            team_2_final = replay.team_2_score[:, -1]
+            self.trajectories = TrajectoryIndex(
+                team_1_score=replay.team_1_score,
+                team_2_score=replay.team_2_score,
+                team_1_probability=replay.team_1_probability,
+                deciding_kick=replay.deciding_kick,
+                winner=np.where(
+                    replay.deciding_kick > 0, np.where(team_1_final > team_2_final, 1, 2), 0
+                ),
+            )
+            for array in self.trajectories:
+                array.flags.writeable = False
+            if self.rate_tables is None and self.tables_key is not None:
+                self.model.compiled_tables[(*self.tables_key, 'trajectories')] = self.trajectories
+        return self.trajectories
+
+    def trajectory(self) -> dict[str, np.ndarray]:
+        """Get the kick-by-kick scores and probabilities of this shootout as arrays.
+
+        Regulation kicks come straight from `trajectory_index`, sudden-death kicks from
+        `shootout_progress`. Kicks not yet taken are NaN up to kick 10, so the arrays line up
+        with `shootout_progress['kick']`.
+        """
+        regulation = self.trajectory_index().lookup(self.state)
+        # only sudden death needs the rest of the progress built
+        progress = self.shootout_progress if self.n_kicks_attempted > MAX_KICKS else None
+        n_kicks = max(MAX_KICKS, self.n_kicks_attempted)
+        trajectory = {'kick': np.arange(1, n_kicks + 1)}
+        for progress_key in ('team_1_score', 'team_2_score', 'team_1_probability'):
+            values = np.full(n_kicks, np.nan)
+            values[:len(regulation[progress_key])] = regulation[progress_key]
+            if progress is not None:
+                values[MAX_KICKS:] = progress[progress_key][MAX_KICKS:]
+            trajectory[progress_key] = values
+        trajectory['team_2_probability'] = 1 - trajectory['team_1_probability']
+        return trajectory
+
+    def outcome_tree(
+        self,
+        n_kicks: int = OUTCOME_TREE_KICKS,
+        single_kick_prob: float | Sequence[float] | None = None,
+    ) -> OutcomeTree:
+        """Get every make/miss path over the next `n_kicks` kicks from the current score.
+
+        Each path's probability of happening comes from `single_kick_prob` (one rate, or one per
+        kick like `simulate_win_probability`), which defaults to the rates from `set_kick_rates`
+        or the shootout's own rate. The win probability after it comes from the compiled tables, the
+        same as `kick` would show. Trees only depend on the score, so they are cached
+        and every later shootout that reaches the same score gets the tree for free.
+        """
+        assert n_kicks > 0, "The tree needs at least one kick"
+        if single_kick_prob is None:
+            single_kick_prob = (
+                self.single_kick_prob if self.kick_probs is None else self.kick_probs
+            )
+        cache_key = (
+            self.state.n_kicks_attempted,
+            self.state.team_1_score,
+            self.state.team_2_score,
+            n_kicks,
+            # key on the rates as given, so a cached tree doesn't pay for `kick_probabilities`
+            single_kick_prob if np.isscalar(single_kick_prob) else tuple(single_kick_prob),
         )
-        self.shootout_team_progress[self.kicking_team.value]['probability'] = kick_team_prob
-        
-        # update the probability for the team not kicking
-        other_team = (
-            kt.team_1 if self.kicking_team == kt.team_2 else kt.team_2
+        if cache_key not in self.outcome_trees:
+            self.outcome_trees[cache_key] = self.build_outcome_tree(
+                n_kicks_attempted=self.state.n_kicks_attempted,
+                team_1_score=self.state.team_1_score,
+                team_2_score=self.state.team_2_score,
+                n_kicks=n_kicks,
+                kick_probs=solver.kick_probabilities(single_kick_prob, self.kicking_order),
+            )
+        return self.outcome_trees[cache_key]
+
+    def build_outcome_tree(
+        self,
+        n_kicks_attempted: int,
+        team_1_score: int,
+        team_2_score: int,
+        n_kicks: int,
+        kick_probs: np.ndarray,
+    ) -> OutcomeTree:
+        """Push the chance of every live score forward one kick at a time until the shootout ends.
+
+        Paths that reach the same score are merged, so a kick costs at most one step per live
+        score instead of doubling the number of paths. Nodes are only kept for the first
+        `n_kicks` kicks, after that the pass just collects the final scores.
+        """
+        levels = []
+        end_probability = np.zeros(n_kicks)
+        final_scores = {}
+        live_scores = {(team_1_score, team_2_score): 1.0}
+        if solver.is_state_over(n_kicks_attempted, team_1_score, team_2_score, self.kicking_order):
+            final_scores[(team_1_score, team_2_score)] = 1.0
+            live_scores = {}
+
+        kick = n_kicks_attempted
+        while live_scores:
+            # past the tree at the start of a sudden-death round every live score is a tie, and
+            # every round from a tie is the same, so the final scores are a geometric series
+            if len(levels) == n_kicks and kick >= MAX_KICKS and kick % 2 == 0:
+                self.add_sudden_death_final_scores(final_scores, live_scores, kick_probs)
+                break
+
+            team_1_kicking = solver.team_1_kicked(kick + 1, self.kicking_order)
+            if kick < MAX_KICKS:
+                single_kick_prob = kick_probs[kick]
+            else:
+                single_kick_prob = kick_probs[MAX_KICKS + (0 if team_1_kicking else 1)]
+            next_scores = {}
+            for (score_1, score_2), reach_probability in live_scores.items():
+                make_score = (score_1 + 1, score_2) if team_1_kicking else (score_1, score_2 + 1)
+                next_scores[make_score] = (
+                    next_scores.get(make_score, 0.0) + reach_probability * single_kick_prob
+                )
+                next_scores[(score_1, score_2)] = (
+                    next_scores.get((score_1, score_2), 0.0) +
+                    reach_probability * (1 - single_kick_prob)
+                )
+            kick += 1
+
+            keep_nodes = len(levels) < n_kicks
+            nodes = {}
+            live_scores = {}
+            for score, reach_probability in next_scores.items():
+                shootout_over = bool(solver.is_state_over(kick, *score, self.kicking_order))
+                if shootout_over:
+                    final_scores[score] = final_scores.get(score, 0.0) + reach_probability
+                else:
+                    live_scores[score] = reach_probability
+                if not keep_nodes:
+                    continue
+
+                if shootout_over:
+                    end_probability[len(levels)] += reach_probability
+                kick_team_prob = self.lookup_win_probability(kick, *score)
+                nodes[score] = OutcomeNode(
+                    n_kicks_attempted=kick,
+                    team_1_score=score[0],
+                    team_2_score=score[1],
+                    reach_probability=reach_probability,
+                    team_1_probability=kick_team_prob if team_1_kicking else 1 - kick_team_prob,
+                    shootout_over=shootout_over,
+                )
+            if keep_nodes:
+                levels.append(nodes)
+
+        return OutcomeTree(
+            n_kicks_attempted=n_kicks_attempted,
+            team_1_score=team_1_score,
+            team_2_score=team_2_score,
+            levels=tuple(levels),
+            end_probability=end_probability,
+            final_scores=final_scores,
+            kicking_order=self.kicking_order,
         )
-        self.shootout_team_progress[other_team.value]['probability'] = 1 - kick_team_prob
 
-        # save results in the running dictionary
-        self.shootout_progress['team_1_score'].append(
-            self.shootout_team_progress[kt.team_1.value]['score']
+    @staticmethod
+    def add_sudden_death_final_scores(
+        final_scores: dict[tuple[int, int], float],
+        tied_scores: dict[tuple[int, int], float],
+        kick_probs: np.ndarray,
+    ):
+        """Add the final scores reached from ties at the start of a sudden-death round.
+
+        A round where both teams miss changes nothing, so from a tie the shootout either moves up
+        one tied goal (both make) or ends, each round like the last. The chance of ending at k
+        goals above the tie is a geometric series, followed until less than
+        `FINAL_SCORE_TOLERANCE` is left.
+        """
+        team_1_prob, team_2_prob = kick_probs[MAX_KICKS:MAX_KICKS + solver.SUDDEN_DEATH_KICKS]
+        changing_round = 1 - (1 - team_1_prob) * (1 - team_2_prob)
+        if changing_round == 0:
+            # both teams always miss, so the shootout never ends
+            return
+        team_1_wins = team_1_prob * (1 - team_2_prob) / changing_round
+        team_2_wins = (1 - team_1_prob) * team_2_prob / changing_round
+        goes_up = team_1_prob * team_2_prob / changing_round
+        for (score_1, score_2), reach_probability in tied_scores.items():
+            for extra_goals in range(MAX_SUDDEN_DEATH_ROUNDS):
+                if reach_probability < FINAL_SCORE_TOLERANCE:
+                    break
+                for final_score, end_prob in (
+                    ((score_1 + extra_goals + 1, score_2 + extra_goals), team_1_wins),
+                    ((score_1 + extra_goals, score_2 + extra_goals + 1), team_2_wins),
+                ):
+                    final_scores[final_score] = (
+                        final_scores.get(final_score, 0.0) + reach_probability * end_prob
+                    )
+                reach_probability *= goes_up
+
+    def replay_shootouts(self, kick_outcomes: np.ndarray) -> BatchReplay:
+        """Replay many shootouts at once from an (N, kicks) array of makes (1) and misses (0).
+
+        Follows the same rules as `kick`: kicks after the shootout is clinched are ignored, so the
+        scores, over flag and probabilities stay at their values from the deciding kick.
+        `deciding_kick` is the 1-based kick that clinched each shootout, or 0 if it never was.
+        """
+        kicks = np.asarray(kick_outcomes).astype(bool)
+        assert kicks.ndim == 2, "Expected an (N, k) array of kicks"
+        n_kicks = np.arange(1, kicks.shape[1] + 1)
+        team_1_kicked = solver.team_1_kicked(n_kicks, self.kicking_order)
+
+        # running scores as if every kick were taken
+        team_1_score = np.cumsum(kicks & team_1_kicked, axis=1)
+        team_2_score = np.cumsum(kicks & ~team_1_kicked, axis=1)
+
+        # find the kick that clinched each shootout and ignore anything after it
+        clinched = solver.is_state_over(n_kicks, team_1_score, team_2_score, self.kicking_order)
+        is_decided = clinched.any(axis=1)
+        deciding_index = np.where(is_decided, clinched.argmax(axis=1), kicks.shape[1] - 1)
+        after_deciding_kick = np.arange(kicks.shape[1]) >= deciding_index[:, None]
+        last_kick_taken = np.minimum(np.arange(kicks.shape[1]), deciding_index[:, None])
+        team_1_score = np.take_along_axis(team_1_score, last_kick_taken, axis=1)
+        team_2_score = np.take_along_axis(team_2_score, last_kick_taken, axis=1)
+
+        # the tables hold the probability for the team that just kicked
+        probability_table, sudden_death_table = self.active_tables()
+        last_kick = n_kicks[last_kick_taken]
+        regulation_kick = last_kick <= MAX_KICKS
+        kick_team_prob = np.where(
+            regulation_kick,
+            probability_table[
+                np.minimum(last_kick, MAX_KICKS),
+                np.minimum(team_1_score, MAX_SCORE),
+                np.minimum(team_2_score, MAX_SCORE),
+            ],
+            sudden_death_table[
+                last_kick % self.kicking_period, np.clip(team_1_score - team_2_score + 1, 0, 2)
+            ],
         )
-        self.shootout_progress['team_2_score'].append(
-            self.shootout_team_progress[kt.team_2.value]['score']
+        team_1_probability = np.where(
+            solver.team_1_kicked(last_kick, self.kicking_order), kick_team_prob, 1 - kick_team_prob
         )
-        if self.kicking_team == kt.team_1:
-            self.shootout_progress['team_1_probability'].append(kick_team_prob)
-            self.shootout_progress['team_2_probability'].append(1 - kick_team_prob)
-        else:
-            self.shootout_progress['team_2_probability'].append(kick_team_prob)
-            self.shootout_progress['team_1_probability'].append(1 - kick_team_prob)
-        
-        # switch the kicking team to the team no longer kicking
-        self.switch_kicking_team()
 
-    def switch_kicking_team(self):
-        """Change the kicking team status object to the other team."""
-        if self.kicking_team == kt.team_1:
-            self.kicking_team = kt.team_2
-        else:
-            self.kicking_team = kt.team_1
+        return BatchReplay(
+            team_1_score=team_1_score,
+            team_2_score=team_2_score,
+            shootout_over=is_decided[:, None] & after_deciding_kick,
+            deciding_kick=np.where(is_decided, deciding_index + 1, 0),
+            team_1_probability=team_1_probability,
+        )
 
     def is_shootout_over(
         self, n_kicks_attempted: int, team_1_score: int, team_2_score: int,
@@ -115,17 +656,17 @@ class PKShootout:
         leading_team = kt.team_1 if score_diff > 0 else kt.team_2
         trailing_team = kt.team_1 if score_diff < 0 else kt.team_2
 
-        # calculate the number of kicks remaining for the trailing team
-        if n_kicks_attempted % 2 == 0:
-            trailing_team_shots_remaining = 5 - n_kicks_attempted / 2
+        # calculate the number of kicks remaining for the trailing team in this round
+        kicks_allotted = solver.kicks_allotted(n_kicks_attempted)
+        team_1_kicks = solver.team_1_kicks_taken(n_kicks_attempted, self.kicking_order)
+        if trailing_team == kt.team_1:
+            trailing_team_shots_remaining = kicks_allotted - team_1_kicks
         else:
-            if trailing_team == kt.team_1:
-                trailing_team_shots_remaining = 5 - ((n_kicks_attempted + 1) / 2)
-            else:
-                trailing_team_shots_remaining = 5 - ((n_kicks_attempted - 1) / 2)
+            trailing_team_shots_remaining = kicks_allotted - (n_kicks_attempted - team_1_kicks)
         # if there are not enough kicks remaining, the shootout is over and the leading team wins
         if trailing_team_shots_remaining < score_diff_abs:
-            return True, self.kicking_team == leading_team
+            team_1_kicked = solver.team_1_kicked(n_kicks_attempted, self.kicking_order)
+            return True, (leading_team == kt.team_1) == team_1_kicked
 
         return False, None
 
@@ -133,50 +674,179 @@ class PKShootout:
         self, team_kicking: team.KickingTeam, kick_success: bool, shootout_over: bool = False
     ) -> float:
         """After a team has kicked, check the score and calculate the probability they win
-        
-        Logic includes:
-        - If the shootout has been clinched, return 0 or 1 based on which team just kicked
-        - Look up the empirical probability of w dinning based on previous world cup shootouts
-        - If we are at a score that has never happened before, simulate makes and misses until we
-        reach a known probability
-        - If the looked up probability is over 0.95 or under 0.05, smooth this a bit so we don't
-        assume it's over when it's not
+
+        If the shootout has been clinched, return 0 or 1 based on which team just kicked. Otherwise
+        read the precompiled probability for the current score with `lookup_win_probability`.
         """
         # if the shootout is over, the kicking team wins on a make and loses on a miss
         if shootout_over:
-            if self.kicking_team == team_kicking and kick_success:
+            team_that_kicked = (
+                kt.team_1 if solver.team_1_kicked(self.n_kicks_attempted, self.kicking_order)
+                else kt.team_2
+            )
+            if team_that_kicked == team_kicking and kick_success:
                 return 1.0
-            elif self.kicking_team == team_kicking and not kick_success:
+            elif team_that_kicked == team_kicking and not kick_success:
                 return 0.0
-            elif self.kicking_team != team_kicking and kick_success:
+            elif team_that_kicked != team_kicking and kick_success:
                 return 0.0
             else:
                 return 1.0
-        
-         # get each teams score after the result of the kick
-        team_1_score = self.shootout_team_progress[kt.team_1.value]['score']
-        team_2_score = self.shootout_team_progress[kt.team_2.value]['score']
 
-        # set tie scores (after a round) to 50% regardless of empirical scores
-        if (team_1_score == team_2_score) and (self.n_kicks_attempted % 2 == 0):
-            return 0.5
+        return self.lookup_win_probability(
+            n_kicks_attempted=self.n_kicks_attempted,
+            team_1_score=self.state.team_1_score,
+            team_2_score=self.state.team_2_score,
+        )
+
+    def lookup_win_probability(
+        self, n_kicks_attempted: int, team_1_score: int, team_2_score: int
+    ) -> float:
+        """Read the probability the team that just kicked wins from the compiled tables.
+
+        Regulation scores come from `probability_table` and sudden-death scores from the constant
+        size `sudden_death_table` (or the tables for the rates from `set_kick_rates`), so the
+        lookup costs the same however long the shootout lasts.
+        """
+        if instrumentation.recorder is not None:
+            instrumentation.recorder.count('table_lookups')
+        probability_table, sudden_death_table = self.active_tables()
+        if n_kicks_attempted <= MAX_KICKS:
+            return float(probability_table[n_kicks_attempted, team_1_score, team_2_score])
+        return float(sudden_death_table[
+            n_kicks_attempted % self.kicking_period, team_1_score - team_2_score + 1
+        ])
+
+    def active_tables(self) -> tuple[np.ndarray, np.ndarray]:
+        """The regulation and sudden-death tables in use, from custom rates or the history."""
+        if self.rate_tables is not None:
+            return self.rate_tables
+        return self.probability_table, self.sudden_death_table
+
+    def build_empirical_table(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the empirical probability of every state and a mask of the ones that were shrunk.
+
+        States with counts are shrunk toward the simulated probability by `prior_strength`
+        shootouts (or are the raw ratio when it's 0). Tables without counts fall back to their
+        stored `win_probability`.
+        """
+        state_totals = np.where(self.state_totals > 0, self.state_totals, 1)
+        empirical_table = np.where(
+            self.state_totals > 0,
+            self.state_wins / state_totals,
+            self.model.win_probabilities,
+        )
+        if self.prior_strength == 0:
+            return empirical_table, np.zeros_like(self.state_totals, dtype=bool)
+
+        prior = solver.solve_win_probabilities(
+            solver.kick_probabilities(self.single_kick_prob, self.kicking_order),
+            kicking_order=self.kicking_order,
+        )
+        shrunk_table = solver.shrink_toward_prior(
+            wins=self.state_wins,
+            totals=self.state_totals,
+            prior=prior,
+            prior_strength=self.prior_strength,
+        )
+        shrunk_states = ~np.isnan(shrunk_table)
+        return np.where(shrunk_states, shrunk_table, empirical_table), shrunk_states
+
+    def build_probability_table(self) -> np.ndarray:
+        """Compile the win probability of the team that just kicked for every reachable state.
+
+        The table is indexed by (kicks_attempted, team_1_score, team_2_score). Clinched states hold
+        0 or 1, every other reachable state holds the smoothed probability from
+        `calc_state_win_probability` and unreachable states are left as NaN.
+        """
+        probability_table = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+        reachable_states = np.argwhere(
+            ~np.isnan(solver.reachable_states(self.kicking_order))
+        ).tolist()
+        for n_kicks_attempted, team_1_score, team_2_score in reachable_states:
+            if n_kicks_attempted == 0:
+                continue
+
+            shootout_over, _ = self.is_shootout_over(
+                n_kicks_attempted=n_kicks_attempted,
+                team_1_score=team_1_score,
+                team_2_score=team_2_score,
+            )
+            if shootout_over:
+                team_1_kicked = solver.team_1_kicked(n_kicks_attempted, self.kicking_order)
+                team_1_leads = team_1_score > team_2_score
+                win_probability = 1.0 if team_1_kicked == team_1_leads else 0.0
+            else:
+                win_probability = self.calc_state_win_probability(
+                    n_kicks_attempted=n_kicks_attempted,
+                    team_1_score=team_1_score,
+                    team_2_score=team_2_score,
+                )
+            probability_table[n_kicks_attempted, team_1_score, team_2_score] = win_probability
+
+        return probability_table
+
+    def build_sudden_death_table(self) -> np.ndarray:
+        """Compile the sudden-death probabilities, smoothed the same way as regulation scores.
+
+        Indexed by (kicks_attempted % kicking_period, team_1_score - team_2_score + 1), see
+        `solver.sudden_death_probabilities`.
+        """
+        sudden_death_table = solver.sudden_death_probabilities(
+            solver.kick_probabilities(self.single_kick_prob, self.kicking_order), self.kicking_order
+        )
+        # only clamp the scores that are still live, clinched ones stay at 0 or 1
+        live_states = (sudden_death_table > 0) & (sudden_death_table < 1)
+        sudden_death_table[live_states] = np.clip(sudden_death_table[live_states], 0.05, 0.95)
+        return sudden_death_table
+
+    def calc_state_win_probability(
+        self, n_kicks_attempted: int, team_1_score: int, team_2_score: int
+    ) -> float:
+        """Calculate the probability the team that just kicked wins from a score that is not over.
+
+        Logic includes:
+        - Look up the empirical probability of winning based on previous world cup shootouts
+        - If we are at a score that has never happened before, simulate makes and misses until we
+        reach a known probability
+        - If the probability wasn't shrunk toward the simulated prior and is over 0.95 or under
+        0.05, smooth this a bit so we don't assume it's over when it's not
+        """
+        # set tie scores (after a round) to 50% regardless of empirical scores, unless it is
+        # going to sudden death which is solved in closed form
+        if (team_1_score == team_2_score) and (n_kicks_attempted % 2 == 0):
+            if n_kicks_attempted < MAX_KICKS:
+                return 0.5
+            return self.simulate_win_probability(
+                n_kicks_attempted=n_kicks_attempted,
+                team_1_score=team_1_score,
+                team_2_score=team_2_score,
+                single_kick_prob=self.single_kick_prob
+            )
 
         # pull the probability from the history of world cups
-        dict_key = f"{self.n_kicks_attempted}_{team_1_score}_{team_2_score}"
-        sub_dict = self.game_probability_dict[dict_key]
-        empirical_win_probability = sub_dict.get('win_probability')
+        empirical_win_probability = self.empirical_table[
+            n_kicks_attempted, team_1_score, team_2_score
+        ]
 
         # if we don't have an empirical probability, simluate kicks until we get to one
-        if pd.isna(empirical_win_probability):
+        recorder = instrumentation.recorder
+        if recorder is not None:
+            recorder.count(
+                'states.simulated' if np.isnan(empirical_win_probability) else 'states.empirical'
+            )
+        if np.isnan(empirical_win_probability):
             win_probability = self.simulate_win_probability(
-                n_kicks_attempted=self.n_kicks_attempted,
+                n_kicks_attempted=n_kicks_attempted,
                 team_1_score=team_1_score,
                 team_2_score=team_2_score,
-                single_kick_prob=SINGLE_KICK_PROB
+                single_kick_prob=self.single_kick_prob
             )
         else:
-            win_probability = empirical_win_probability
+            win_probability = float(empirical_win_probability)
 
+        if self.shrunk_states[n_kicks_attempted, team_1_score, team_2_score]:
+            return win_probability
         if win_probability >= 0.95:
             return 0.95
         elif win_probability <= 0.05:
@@ -188,114 +858,61 @@ class PKShootout:
         n_kicks_attempted: int,
         team_1_score: int,
         team_2_score: int,
-        single_kick_prob: float
+        single_kick_prob: float | Sequence[float]
     ) -> float:
         """Simulate kicks in the shootout until we can recalculate a probability.
 
-        Logic goes as follows
-        1. Look up if the empirical probability exists
-        2. If not, find probabilities if the next kick were to be either a make or a miss
-        3. Recursively search until we either find a probability or hit an end score
-        4. Weight the odds of the kicks based on historical kick accuracy
+        Every state is solved bottom-up by `solver.solve_win_probabilities`: known empirical
+        probabilities are used as is (only if using empirical method) and any other score weights
+        the make and miss of the next kick by `single_kick_prob`, which can also be one conversion
+        rate per kick. Solved tables are kept in an LRU cache per conversion rate, so repeated
+        calls are a single array read and memory stays bounded. Sudden-death scores come from
+        `solver.sudden_death_probabilities`.
         """
-        game_key = f"{n_kicks_attempted}_{team_1_score}_{team_2_score}"
-        sub_dict = self.game_probability_dict.get(game_key)
-
-        # if we have a win probability, return this (only if using empirical method)
-        base_win_prob = None
-        if self.probability_type == 'empirical':
-            base_win_prob = sub_dict.get('win_probability')
-        if pd.notna(base_win_prob):
-            return base_win_prob
-
-        # check if the shootout is over and return the probability if it is
-        shootout_over, kicking_team_wins = self.is_shootout_over(
-            n_kicks_attempted=n_kicks_attempted,
-            team_1_score=team_1_score,
-            team_2_score=team_2_score
-        )
-        if shootout_over:
-            if kicking_team_wins:
-                return 1.0
-            else:
-                return 0.0
-
-        # get the next 2 game keys and their dictionaries
-        game_key_miss_next = f"{n_kicks_attempted+1}_{team_1_score}_{team_2_score}"
-        if n_kicks_attempted % 2 == 1:
-            game_key_make_next = f"{n_kicks_attempted+1}_{team_1_score}_{team_2_score + 1}"
-        else:
-            game_key_make_next = f"{n_kicks_attempted+1}_{team_1_score + 1}_{team_2_score}"
-        sub_dict_make = self.game_probability_dict[game_key_make_next]
-        sub_dict_miss = self.game_probability_dict[game_key_miss_next]
-
-        # pull each of those probabilities
-        win_prob_make_next = sub_dict_make.get('win_probability')
-        win_prob_miss_next = sub_dict_miss.get('win_probability')
-
-        # if both probabilities exist, return a probability
-        if pd.notna(win_prob_make_next) and pd.notna(win_prob_miss_next):
-            return (single_kick_prob * win_prob_make_next +
-                    (1 - single_kick_prob) * win_prob_miss_next)
-
-        # if the probability on a miss doesn't exist, recursively get it
-        if pd.isna(win_prob_miss_next):
-            win_prob_miss_next = self.simulate_win_probability(
-                n_kicks_attempted=n_kicks_attempted + 1,
-                team_1_score=team_1_score,
-                team_2_score=team_2_score,
-                single_kick_prob=SINGLE_KICK_PROB
-            )
-
-        # if the probability on a make doesn't exist, recursively get it
-        if pd.isna(win_prob_make_next):
-            if n_kicks_attempted % 2 == 1:
-                win_prob_make_next = self.simulate_win_probability(
-                    n_kicks_attempted=n_kicks_attempted + 1,
-                    team_1_score=team_1_score,
-                    team_2_score=team_2_score + 1,
-                    single_kick_prob=SINGLE_KICK_PROB
-                )
-            else:
-                win_prob_make_next = self.simulate_win_probability(
-                    n_kicks_attempted=n_kicks_attempted + 1,
-                    team_1_score=team_1_score + 1,
-                    team_2_score=team_2_score,
-                    single_kick_prob=SINGLE_KICK_PROB
+        recorder = instrumentation.recorder
+        if recorder is not None:
+            recorder.count('simulate_win_probability')
+            if n_kicks_attempted <= MAX_KICKS:
+                # how far the solver looks ahead from this score, at most to the end of regulation
+                recorder.observe(
+                    'simulate_depth',
+                    MAX_KICKS - n_kicks_attempted,
+                    buckets=instrumentation.DEPTH_BUCKETS,
                 )
+        kick_probs = solver.kick_probabilities(single_kick_prob, self.kicking_order)
+        cache_key = tuple(kick_probs)
+        if self.probability_type == 'simulated' or n_kicks_attempted > MAX_KICKS:
+            # without empirical probabilities the tables only depend on the rates, so share them
+            probability_table, sudden_death_table = solver.rate_tables(
+                cache_key, self.kicking_order
+            )
+            if n_kicks_attempted > MAX_KICKS:
+                return float(sudden_death_table[
+                    n_kicks_attempted % self.kicking_period, team_1_score - team_2_score + 1
+                ])
+            return float(probability_table[n_kicks_attempted, team_1_score, team_2_score])
 
-        # return the inverse probability because we have assume the 'next' team is kicking
-        return (
-            1 - (
-                single_kick_prob * win_prob_make_next +
-                (1 - single_kick_prob) * win_prob_miss_next
-                )
+        if recorder is not None:
+            recorder.count(
+                'simulated_tables.hit' if cache_key in self.simulated_tables
+                else 'simulated_tables.miss'
+            )
+        if cache_key in self.simulated_tables:
+            self.simulated_tables.move_to_end(cache_key)
+        else:
+            self.simulated_tables[cache_key] = solver.solve_win_probabilities(
+                kick_probs=kick_probs,
+                empirical_table=self.empirical_table,
+                kicking_order=self.kicking_order,
             )
+            if len(self.simulated_tables) > solver.RATE_TABLE_CACHE_SIZE:
+                self.simulated_tables.popitem(last=False)
+        return float(
+            self.simulated_tables[cache_key][n_kicks_attempted, team_1_score, team_2_score]
+        )
 
     def reset_shootout(self):
-        """Reset all the object values to zero or to their initial state."""
-        self.n_kicks_attempted = 0
+        """Go back to before the first kick."""
+        self.state = ShootoutState(kicking_order=self.kicking_order)
         self.shootout_is_over = False
-        self.shootout_team_progress = {
-            kt.team_1.value: {
-                'kicks_attempted': 0,
-                'kicks_remaining': 5,
-                'score': 0,
-                'probability': 0.5,
-            },
-            kt.team_2.value: {
-                'kicks_attempted': 0,
-                'kicks_remaining': 5,
-                'score': 0,
-                'probability': 0.5,
-            },
-        }
-        self.shootout_progress = {
-            'kick': list(range(1, 11)),
-            'kicks': [],
-            'team_1_score': [],
-            'team_2_score': [],
-            'team_1_probability': [],
-            'team_2_probability': [],
-        }
-        self.kicking_team = kt.team_1
+        self.update_probabilities()
@@ -0,0 +1,99 @@
+from typing import NamedTuple, Sequence
+
+from data import team
+import solver
+
+
+class _ShootoutStateFields(NamedTuple):
+    n_kicks_attempted: int
+    team_1_score: int
+    team_2_score: int
+    outcomes: int
+    kicking_order: str
+
+
+class ShootoutState(_ShootoutStateFields):
+    """Compact, immutable and hashable state of a shootout.
+
+    Bit i of `outcomes` is 1 if kick i + 1 was scored, so the state holds the full kick history
+    in a single int and can be used as a cache key. Kicking a new kick or undoing the last one
+    returns a new state in constant time. `kicking_order` is the pattern of the shootout's
+    kicking order, see `team.kicking_pattern`. It is only checked when a state is created
+    directly, the states after and before a kick reuse the pattern they came from.
+    """
+    __slots__ = ()
+
+    def __new__(
+        cls,
+        n_kicks_attempted: int = 0,
+        team_1_score: int = 0,
+        team_2_score: int = 0,
+        outcomes: int = 0,
+        kicking_order: team.KickingOrder | str = solver.ABAB,
+    ) -> 'ShootoutState':
+        return tuple.__new__(cls, (
+            n_kicks_attempted,
+            team_1_score,
+            team_2_score,
+            outcomes,
+            team.kicking_pattern(kicking_order),
+        ))
+
+    @classmethod
+    def from_kicks(
+        cls, kicks: Sequence[bool], kicking_order: team.KickingOrder | str = solver.ABAB
+    ) -> 'ShootoutState':
+        state = cls(kicking_order=kicking_order)
+        for kick_success in kicks:
+            state = state.after_kick(kick_success)
+        return state
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(n_kicks_attempted={self.n_kicks_attempted}, "
+            f"team_1_score={self.team_1_score}, team_2_score={self.team_2_score}, "
+            f"outcomes={self.outcomes:#b}, kicking_order={self.kicking_order!r})"
+        )
+
+    @property
+    def team_1_kicks_next(self) -> bool:
+        return self.kicking_order[self.n_kicks_attempted % len(self.kicking_order)] == 'A'
+
+    @property
+    def is_over(self) -> bool:
+        return bool(solver.is_state_over(
+            self.n_kicks_attempted, self.team_1_score, self.team_2_score, self.kicking_order
+        ))
+
+    @property
+    def kicks(self) -> list[bool]:
+        return [bool(self.outcomes >> kick & 1) for kick in range(self.n_kicks_attempted)]
+
+    def after_kick(self, kick_success: bool) -> 'ShootoutState':
+        """The state after the next kick is taken."""
+        n_kicks_attempted, team_1_score, team_2_score, outcomes, kicking_order = self
+        if kick_success:
+            outcomes |= 1 << n_kicks_attempted
+            if kicking_order[n_kicks_attempted % len(kicking_order)] == 'A':
+                team_1_score += 1
+            else:
+                team_2_score += 1
+        # the pattern was checked when the first state was made
+        return tuple.__new__(ShootoutState, (
+            n_kicks_attempted + 1, team_1_score, team_2_score, outcomes, kicking_order
+        ))
+
+    def before_last_kick(self) -> 'ShootoutState':
+        """The state before the last kick was taken."""
+        assert self.n_kicks_attempted > 0, "No kicks to undo"
+        n_kicks_attempted, team_1_score, team_2_score, outcomes, kicking_order = self
+        n_kicks_attempted -= 1
+        if outcomes >> n_kicks_attempted & 1:
+            outcomes &= ~(1 << n_kicks_attempted)
+            if kicking_order[n_kicks_attempted % len(kicking_order)] == 'A':
+                team_1_score -= 1
+            else:
+                team_2_score -= 1
+        return tuple.__new__(ShootoutState, (
+            n_kicks_attempted, team_1_score, team_2_score, outcomes, kicking_order
+        ))
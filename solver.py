@@ -0,0 +1,402 @@
+from functools import lru_cache
+from typing import Mapping, Sequence
+
+import numpy as np
+
+from data import team
+from data.team import team_1_kicked, team_1_kicks_taken  # noqa: F401, part of the solver API
+
+SINGLE_KICK_PROB = 0.690625  # based on historic data
+MAX_KICKS = 10
+MAX_SCORE = 5
+SUDDEN_DEATH_KICKS = 2  # one kick per team in every sudden-death round
+RATE_TABLE_CACHE_SIZE = 256  # solved tables kept for different sets of kick rates
+ABAB = team.KickingOrder.abab.value
+
+
+def kicks_allotted(n_kicks_attempted):
+    """Number of kicks each team gets up to the end of the current round.
+
+    That is 5 in regulation, then one more per team for every round of sudden death.
+    """
+    if isinstance(n_kicks_attempted, int):
+        # plain ints skip NumPy, which is most of the cost of a single state check
+        return max(MAX_SCORE, (n_kicks_attempted + 1) // 2)
+    return np.maximum(MAX_SCORE, (n_kicks_attempted + 1) // 2)
+
+
+def is_state_over(
+    n_kicks_attempted, team_1_score, team_2_score, kicking_order: team.KickingOrder | str = ABAB
+):
+    """Check if the trailing team no longer has enough kicks left to catch up.
+
+    Works on ints or elementwise on NumPy arrays, in regulation and in sudden death.
+    """
+    team_kicks_allotted = kicks_allotted(n_kicks_attempted)
+    team_1_kicks = team_1_kicks_taken(n_kicks_attempted, kicking_order)
+    team_1_kicks_remaining = team_kicks_allotted - team_1_kicks
+    team_2_kicks_remaining = team_kicks_allotted - (n_kicks_attempted - team_1_kicks)
+    return (
+        (team_1_score + team_1_kicks_remaining < team_2_score) |
+        (team_2_score + team_2_kicks_remaining < team_1_score)
+    )
+
+
+@lru_cache(maxsize=None)
+def over_states(kicking_order: team.KickingOrder | str = ABAB) -> np.ndarray:
+    """Boolean mask of every (kicks_attempted, team_1_score, team_2_score) that is clinched.
+
+    The mask is read-only and shared by every caller with the same kicking order.
+    """
+    shootout_over = np.zeros((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), dtype=bool)
+    for n_kicks_attempted in range(MAX_KICKS + 1):
+        for team_1_score in range(MAX_SCORE + 1):
+            for team_2_score in range(MAX_SCORE + 1):
+                shootout_over[n_kicks_attempted, team_1_score, team_2_score] = is_state_over(
+                    n_kicks_attempted, team_1_score, team_2_score, kicking_order
+                )
+    shootout_over.flags.writeable = False
+    return shootout_over
+
+
+def kick_probabilities(
+    single_kick_prob: float | Sequence[float], kicking_order: team.KickingOrder | str = ABAB
+) -> np.ndarray:
+    """Expand conversion rates into an array for kicks 1 to 10 plus team 1 and team 2's rate in
+    sudden death.
+
+    Takes a single rate, one rate per regulation kick (sudden death then reuses each team's fifth
+    kick in `kicking_order`) or one rate per regulation kick followed by the two sudden-death
+    rates.
+    """
+    kick_probs = np.atleast_1d(np.asarray(single_kick_prob, dtype=float))
+    if len(kick_probs) == MAX_KICKS:
+        team_1_kicks = team_1_kicked(np.arange(1, MAX_KICKS + 1), kicking_order)
+        kick_probs = np.concatenate([
+            kick_probs,
+            [kick_probs[team_1_kicks][-1], kick_probs[~team_1_kicks][-1]],
+        ])
+    kick_probs = np.broadcast_to(kick_probs, (MAX_KICKS + SUDDEN_DEATH_KICKS,))
+    assert ((kick_probs >= 0) & (kick_probs <= 1)).all(), "Kick probabilities must be in [0, 1]"
+    return kick_probs.copy()
+
+
+def team_kick_rates(rates: float | Sequence[float], n_team_kicks: int) -> np.ndarray:
+    """Conversion rate of each of a team's kicks, cycling through the kickers in order.
+
+    A single rate applies to every kick, a sequence is one rate per kicker in kicking order.
+    """
+    kicker_rates = np.atleast_1d(np.asarray(rates, dtype=float))
+    assert ((kicker_rates >= 0) & (kicker_rates <= 1)).all(), "Conversion rates must be in [0, 1]"
+    return kicker_rates[np.arange(n_team_kicks) % len(kicker_rates)]
+
+
+def sudden_death_rate(rates: float | Sequence[float]) -> float:
+    """One conversion rate for all of a team's sudden-death kicks, the average over its kickers.
+
+    The closed form in `sudden_death_probabilities` needs one rate per team, and the Monte Carlo
+    uses the same one so both engines agree on the same lineups.
+    """
+    return float(np.mean(rates))
+
+
+def lineup_rates(
+    lineup: Sequence[str], kicker_rates: Mapping[str, float], default_rate: float = SINGLE_KICK_PROB
+) -> list[float]:
+    """Conversion rate of each named kicker in kicking order, `default_rate` for unknown ones."""
+    return [kicker_rates.get(kicker, default_rate) for kicker in lineup]
+
+
+def adjust_for_goalkeeper(
+    kick_rates: np.ndarray, save_rate: float, league_rate: float = SINGLE_KICK_PROB
+) -> np.ndarray:
+    """Adjust conversion rates for the goalkeeper facing them with the odds ratio method.
+
+    `save_rate` is the share of kicks the keeper keeps out. A keeper who keeps out the league
+    share (1 - `league_rate`) leaves the rates as they are, a better one scales down the odds of
+    every kick scoring.
+    """
+    kick_rates = np.asarray(kick_rates, dtype=float)
+    assert 0 <= save_rate <= 1, "Save rates must be in [0, 1]"
+    concede_rate = 1 - save_rate
+    score_weight = kick_rates * concede_rate * (1 - league_rate)
+    miss_weight = (1 - kick_rates) * (1 - concede_rate) * league_rate
+    with np.errstate(invalid='ignore'):
+        adjusted = score_weight / (score_weight + miss_weight)
+    # a sure kick against a keeper who saves everything, keep the kicker's rate
+    return np.where(score_weight + miss_weight > 0, adjusted, kick_rates)
+
+
+def lineup_kick_probabilities(
+    team_1_rates: float | Sequence[float] = SINGLE_KICK_PROB,
+    team_2_rates: float | Sequence[float] = SINGLE_KICK_PROB,
+    team_1_save_rate: float | None = None,
+    team_2_save_rate: float | None = None,
+    kicking_order: team.KickingOrder | str = ABAB,
+) -> np.ndarray:
+    """Kick probabilities in the `kick_probabilities` layout for two lineups and their keepers.
+
+    Each team's rates are one rate or one per kicker in kicking order, cycled like the Monte Carlo
+    does. Sudden death uses each team's `sudden_death_rate`. Each save rate is for that team's own
+    goalkeeper, so it adjusts the other team's kicks.
+    """
+    kicks_per_team = MAX_KICKS // 2
+    team_1_regulation_kicks = team_1_kicked(np.arange(1, MAX_KICKS + 1), kicking_order)
+    team_1_kicks = np.r_[np.flatnonzero(team_1_regulation_kicks), MAX_KICKS]
+    team_2_kicks = np.r_[np.flatnonzero(~team_1_regulation_kicks), MAX_KICKS + 1]
+    kick_probs = np.empty(MAX_KICKS + SUDDEN_DEATH_KICKS)
+    kick_probs[team_1_kicks] = np.r_[
+        team_kick_rates(team_1_rates, kicks_per_team), sudden_death_rate(team_1_rates)
+    ]
+    kick_probs[team_2_kicks] = np.r_[
+        team_kick_rates(team_2_rates, kicks_per_team), sudden_death_rate(team_2_rates)
+    ]
+
+    if team_2_save_rate is not None:
+        kick_probs[team_1_kicks] = adjust_for_goalkeeper(kick_probs[team_1_kicks], team_2_save_rate)
+    if team_1_save_rate is not None:
+        kick_probs[team_2_kicks] = adjust_for_goalkeeper(kick_probs[team_2_kicks], team_1_save_rate)
+    return kick_probs
+
+
+def sudden_death_probabilities(
+    kick_probs: np.ndarray, kicking_order: team.KickingOrder | str = ABAB
+) -> np.ndarray:
+    """Closed-form win probability of the team that just kicked for every sudden-death state.
+
+    Indexed by (kicks_attempted % len(pattern), team_1_score - team_2_score + 1) for the
+    repeating pattern of `kicking_order`, so the table stays the same size however long the
+    shootout lasts. Each round is independent and it doesn't matter who kicks first in it, so
+    from a tie team 1 wins with the geometric series p1 (1 - p2) / (p1 (1 - p2) + (1 - p1) p2).
+    Unreachable states are NaN.
+    """
+    team_1_prob, team_2_prob = kick_probs[MAX_KICKS:MAX_KICKS + SUDDEN_DEATH_KICKS]
+    team_1_round_win = team_1_prob * (1 - team_2_prob)
+    team_2_round_win = (1 - team_1_prob) * team_2_prob
+    if team_1_round_win + team_2_round_win > 0:
+        team_1_tied_win = team_1_round_win / (team_1_round_win + team_2_round_win)
+    else:
+        # neither team can ever win a round, so call it a coin flip
+        team_1_tied_win = 0.5
+
+    pattern = team.kicking_pattern(kicking_order)
+    sudden_death_table = np.empty((len(pattern), 3))
+    for position in range(len(pattern)):
+        team_1_kicked_last = pattern[position - 1] == 'A'
+        tied_win = team_1_tied_win if team_1_kicked_last else 1 - team_1_tied_win
+        if position % 2 == 0:
+            # the round is over: the team that just kicked won it, it is tied going into the next
+            # round, or they lost it
+            row = [0.0, tied_win, 1.0]
+        else:
+            # first kick of the round: after a miss the other team can win, after a make the
+            # other team must score
+            other_team_prob = team_2_prob if team_1_kicked_last else team_1_prob
+            row = [
+                np.nan, (1 - other_team_prob) * tied_win, 1 - other_team_prob * (1 - tied_win)
+            ]
+        # rows are laid out from the team that just kicked trailing to leading, flip for team 2
+        sudden_death_table[position] = row if team_1_kicked_last else row[::-1]
+    return sudden_death_table
+
+
+def empirical_table_from_dict(game_probability_dict: dict) -> np.ndarray:
+    """Lay the empirical probabilities from `probability_dict.json` out as a dense state array."""
+    empirical_table = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+    for sub_dict in game_probability_dict.values():
+        win_probability = sub_dict.get('win_probability')
+        if win_probability is not None:
+            empirical_table[
+                sub_dict['n_kicks_attempted'], sub_dict['team_1_score'], sub_dict['team_2_score']
+            ] = win_probability
+    return empirical_table
+
+
+def state_counts_from_dict(game_probability_dict: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Lay the per-state win and occurrence counts out as dense state arrays.
+
+    Tables built before counts were stored have no `n_shootouts`, so those states count as unseen.
+    """
+    wins = np.zeros((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), dtype=np.int64)
+    totals = np.zeros((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), dtype=np.int64)
+    for sub_dict in game_probability_dict.values():
+        if sub_dict.get('n_shootouts'):
+            state = (
+                sub_dict['n_kicks_attempted'], sub_dict['team_1_score'], sub_dict['team_2_score']
+            )
+            wins[state] = sub_dict['wins']
+            totals[state] = sub_dict['n_shootouts']
+    return wins, totals
+
+
+def intervals_from_dict(game_probability_dict: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Lay the bootstrap confidence intervals out as dense lower and upper bound arrays.
+
+    States without an interval, and every state of tables built before intervals were stored,
+    are NaN.
+    """
+    lower = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+    upper = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+    for sub_dict in game_probability_dict.values():
+        if sub_dict.get('ci_lower') is not None:
+            state = (
+                sub_dict['n_kicks_attempted'], sub_dict['team_1_score'], sub_dict['team_2_score']
+            )
+            lower[state] = sub_dict['ci_lower']
+            upper[state] = sub_dict['ci_upper']
+    return lower, upper
+
+
+def record_shootout(
+    wins: np.ndarray,
+    totals: np.ndarray,
+    kicks: Sequence[bool],
+    kicking_order: team.KickingOrder | str = ABAB,
+):
+    """Add one finished shootout to the state counts in place.
+
+    Only touches the (at most 10) regulation states the shootout passed through.
+    """
+    team_1_score, team_2_score = 0, 0
+    for n_kicks_attempted, kick_success in enumerate(kicks, start=1):
+        if team_1_kicked(n_kicks_attempted, kicking_order):
+            team_1_score += int(kick_success)
+        else:
+            team_2_score += int(kick_success)
+    assert is_state_over(
+        len(kicks), team_1_score, team_2_score, kicking_order
+    ), "The shootout is not over"
+    team_1_won = team_1_score > team_2_score
+
+    team_1_score, team_2_score = 0, 0
+    for n_kicks_attempted, kick_success in enumerate(kicks[:MAX_KICKS], start=1):
+        team_1_kicked_last = team_1_kicked(n_kicks_attempted, kicking_order)
+        if team_1_kicked_last:
+            team_1_score += int(kick_success)
+        else:
+            team_2_score += int(kick_success)
+        totals[n_kicks_attempted, team_1_score, team_2_score] += 1
+        wins[n_kicks_attempted, team_1_score, team_2_score] += int(
+            team_1_kicked_last == team_1_won
+        )
+
+
+def shrink_toward_prior(
+    wins: np.ndarray, totals: np.ndarray, prior: np.ndarray, prior_strength: float
+) -> np.ndarray:
+    """Bayesian estimate of each state's probability, shrinking low-count states to a prior.
+
+    A Beta prior worth `prior_strength` shootouts centred on `prior`, so a state seen once moves
+    only part of the way from the prior towards its single result. States never seen are NaN.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shrunk = (wins + prior_strength * prior) / (totals + prior_strength)
+    return np.where(totals > 0, shrunk, np.nan)
+
+
+def solve_win_probabilities(
+    kick_probs: np.ndarray,
+    empirical_table: np.ndarray | None = None,
+    kicking_order: team.KickingOrder | str = ABAB,
+) -> np.ndarray:
+    """Fill the win probability of the team that just kicked for every reachable state.
+
+    Backward induction from kick 10 to kick 0, so every state is solved exactly once:
+    1. Clinched states are 1 or 0 depending on whether the team that just kicked leads
+    2. Ties after 10 kicks go to sudden death, see `sudden_death_probabilities`
+    3. If an empirical table is given, use its probability wherever one exists
+    4. Otherwise weight the two next states by the conversion rate of the next kick. The next
+    state's probability is for the team that takes that kick, so take the inverse if it is the
+    other team
+
+    Kick 0 is treated as if team 2 just kicked. Unreachable states are left as NaN.
+    """
+    sudden_death_tie = sudden_death_probabilities(kick_probs, kicking_order)[
+        MAX_KICKS % len(team.kicking_pattern(kicking_order)), 1
+    ]
+    win_probabilities = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+    for n_kicks_attempted in range(MAX_KICKS, -1, -1):
+        team_1_kicked_last = team_1_kicked(n_kicks_attempted, kicking_order)
+        team_1_kicks_next = team_1_kicked(n_kicks_attempted + 1, kicking_order)
+        team_1_kicks = team_1_kicks_taken(n_kicks_attempted, kicking_order)
+        for team_1_score in range(team_1_kicks + 1):
+            for team_2_score in range(n_kicks_attempted - team_1_kicks + 1):
+                if is_state_over(n_kicks_attempted, team_1_score, team_2_score, kicking_order):
+                    team_1_leads = team_1_score > team_2_score
+                    win_probability = 1.0 if team_1_kicked_last == team_1_leads else 0.0
+                elif n_kicks_attempted == MAX_KICKS:
+                    win_probability = sudden_death_tie
+                elif (
+                    empirical_table is not None and
+                    not np.isnan(empirical_table[n_kicks_attempted, team_1_score, team_2_score])
+                ):
+                    win_probability = empirical_table[
+                        n_kicks_attempted, team_1_score, team_2_score
+                    ]
+                else:
+                    single_kick_prob = kick_probs[n_kicks_attempted]
+                    win_prob_miss_next = win_probabilities[
+                        n_kicks_attempted + 1, team_1_score, team_2_score
+                    ]
+                    if team_1_kicks_next:
+                        win_prob_make_next = win_probabilities[
+                            n_kicks_attempted + 1, team_1_score + 1, team_2_score
+                        ]
+                    else:
+                        win_prob_make_next = win_probabilities[
+                            n_kicks_attempted + 1, team_1_score, team_2_score + 1
+                        ]
+                    next_kicker_win_probability = (
+                        single_kick_prob * win_prob_make_next +
+                        (1 - single_kick_prob) * win_prob_miss_next
+                    )
+                    if team_1_kicks_next == team_1_kicked_last:
+                        win_probability = next_kicker_win_probability
+                    else:
+                        win_probability = 1 - next_kicker_win_probability
+                win_probabilities[n_kicks_attempted, team_1_score, team_2_score] = win_probability
+
+    return win_probabilities * reachable_states(kicking_order)
+
+
+def reachable_states(kicking_order: team.KickingOrder | str = ABAB) -> np.ndarray:
+    """Mask of the states a shootout can pass through, as 1.0 for reachable and NaN otherwise."""
+    reachable = np.full((MAX_KICKS + 1, MAX_SCORE + 1, MAX_SCORE + 1), np.nan)
+    reachable[0, 0, 0] = 1.0
+    for n_kicks_attempted in range(MAX_KICKS):
+        team_1_kicks_next = team_1_kicked(n_kicks_attempted + 1, kicking_order)
+        team_1_kicks = team_1_kicks_taken(n_kicks_attempted, kicking_order)
+        for team_1_score in range(team_1_kicks + 1):
+            for team_2_score in range(n_kicks_attempted - team_1_kicks + 1):
+                if (
+                    np.isnan(reachable[n_kicks_attempted, team_1_score, team_2_score]) or
+                    is_state_over(n_kicks_attempted, team_1_score, team_2_score, kicking_order)
+                ):
+                    continue
+                reachable[n_kicks_attempted + 1, team_1_score, team_2_score] = 1.0
+                if team_1_kicks_next:
+                    reachable[n_kicks_attempted + 1, team_1_score + 1, team_2_score] = 1.0
+                else:
+                    reachable[n_kicks_attempted + 1, team_1_score, team_2_score + 1] = 1.0
+    return reachable
+
+
+@lru_cache(maxsize=RATE_TABLE_CACHE_SIZE)
+def rate_tables(
+    kick_probs: tuple[float, ...], kicking_order: team.KickingOrder | str = ABAB
+) -> tuple[np.ndarray, np.ndarray]:
+    """Solved regulation and sudden-death tables for one set of kick probabilities.
+
+    Takes the output of `kick_probabilities` as a tuple so it can be the cache key. The tables
+    are read-only and shared by every caller, and only the most recently used sets of rates and
+    kicking orders are kept, so memory stays bounded however many lineups are tried.
+    """
+    kick_probs = np.array(kick_probs)
+    assert len(kick_probs) == MAX_KICKS + SUDDEN_DEATH_KICKS, "Expected kick_probabilities output"
+    tables = (
+        solve_win_probabilities(kick_probs, kicking_order=kicking_order),
+        sudden_death_probabilities(kick_probs, kicking_order),
+    )
+    for table in tables:
+        table.flags.writeable = False
+    return tables
@@ -0,0 +1,40 @@
+import numpy as np
+
+import monte_carlo
+import pk_shootout
+import solver
+
+N_SHOOTOUTS = 1_000_000
+
+
+def test_final_score_counts_match_outcome_tree():
+    """The simulated final scores, sudden death included, match the exact distribution."""
+    result = monte_carlo.run_monte_carlo(N_SHOOTOUTS, seed=0, n_workers=1)
+    final_scores = pk_shootout.PKShootout().outcome_tree(n_kicks=1).final_scores
+
+    n_goals = max(max(score) for score in final_scores) + 1
+    exact = np.zeros((n_goals, n_goals))
+    for score, probability in final_scores.items():
+        exact[score] = probability
+    simulated = np.zeros_like(exact)
+    counts = result.final_score_counts[:n_goals, :n_goals]
+    simulated[:counts.shape[0], :counts.shape[1]] = counts / result.n_shootouts
+
+    # five standard errors of a binomial proportion, with a floor for the rarest scores
+    tolerance = 5 * np.sqrt(np.maximum(exact * (1 - exact), 1e-6) / N_SHOOTOUTS)
+    assert np.all(np.abs(simulated - exact) <= tolerance)
+    assert abs(simulated.sum() - 1) < 1e-3
+
+
+def test_lineup_win_probability_matches_solver():
+    """Per-kicker lineups give the same win probability as the solver, sudden death included."""
+    team_1_rates, team_2_rates = [0.9, 0.6, 0.8, 0.7, 0.75], [0.65, 0.85, 0.7, 0.8, 0.6]
+    result = monte_carlo.run_monte_carlo(N_SHOOTOUTS, team_1_rates, team_2_rates, seed=0)
+    probability_table, _ = solver.rate_tables(
+        tuple(solver.lineup_kick_probabilities(team_1_rates, team_2_rates))
+    )
+    # kick 0 counts as team 2 having just kicked
+    exact = 1 - probability_table[0, 0, 0]
+
+    tolerance = 5 * np.sqrt(exact * (1 - exact) / N_SHOOTOUTS)
+    assert abs(result.team_1_win_probability - exact) <= tolerance
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import model as probability_model
+import pk_shootout
+import solver
+
+STATE_SHAPE = (solver.MAX_KICKS + 1, solver.MAX_SCORE + 1, solver.MAX_SCORE + 1)
+TEAM_1_WINS = [True, False] * 3
+
+
+def counted_model(shootouts) -> probability_model.ProbabilityModel:
+    """A model whose history is the state counts of `shootouts`."""
+    wins, totals = np.zeros(STATE_SHAPE, dtype=np.int64), np.zeros(STATE_SHAPE, dtype=np.int64)
+    for kicks in shootouts:
+        solver.record_shootout(wins, totals, kicks)
+    no_intervals = np.full(STATE_SHAPE, np.nan)
+    return probability_model.ProbabilityModel(
+        file_path='counted',
+        mtime_ns=0,
+        win_probabilities=np.full(STATE_SHAPE, np.nan),
+        state_wins=wins,
+        state_totals=totals,
+        ci_lower=no_intervals,
+        ci_upper=no_intervals,
+    )
+
+
+def test_record_shootout_refuses_tables_without_counts():
+    shootout = pk_shootout.PKShootout()
+    assert not shootout.state_totals.any()
+    with pytest.raises(ValueError):
+        shootout.record_shootout([True] * 9 + [False])
+
+
+def test_record_shootout_matches_a_table_built_with_it():
+    shootout = pk_shootout.PKShootout(model=counted_model([TEAM_1_WINS]))
+    shootout.record_shootout([False, True] * 3)
+    rebuilt = pk_shootout.PKShootout(model=counted_model([TEAM_1_WINS, [False, True] * 3]))
+    np.testing.assert_array_equal(shootout.probability_table, rebuilt.probability_table)
+
+
+def test_undo_and_restore_match_replaying_the_kicks():
+    # into sudden death, where ABBA has team 2 kicking first in every other round
+    kicks = [True] * 12 + [False, True]
+    replayed = pk_shootout.PKShootout(kicking_order='ABBA')
+    shootout = pk_shootout.PKShootout(kicking_order='ABBA')
+    for n_kicks, kick_success in enumerate(kicks, start=1):
+        replayed.reset_shootout()
+        for earlier_kick in kicks[:n_kicks]:
+            replayed.kick(earlier_kick)
+        # a mis-entered kick, taken back
+        shootout.kick(not kick_success)
+        shootout.undo_last_kick()
+        shootout.kick(kick_success)
+        if n_kicks % 3 == 0:
+            shootout.restore(replayed.snapshot())
+        assert shootout.snapshot() == replayed.snapshot()
+        assert shootout.shootout_team_progress == replayed.shootout_team_progress
+        assert shootout.shootout_progress == replayed.shootout_progress
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 
 from data import team
 import pk_shootout
@@ -36,13 +35,17 @@ with col2:
 if st.button('Reset Count', icon=':material/restart_alt:', type='tertiary'):
     st.session_state.pk.reset_shootout()
 
+# Button to take back a kick that was entered wrong
+if st.button('Undo Last Kick', icon=':material/undo:', type='tertiary'):
+    st.session_state.pk.undo_last_kick()
+
 
 st.markdown(
     f"### Team Kicking: {CLEAN_NAME_MAP[st.session_state.pk.kicking_team.value]}"
 )
 
 # Display the number of clicks
-if st.session_state.pk.n_kicks_attempted < 10:
+if not st.session_state.pk.shootout_is_over:
     st.write(f'Kick number {st.session_state.pk.n_kicks_attempted + 1}')
 else:
     st.write(f'Kick number {st.session_state.pk.n_kicks_attempted}')
@@ -74,12 +77,10 @@ with col2:
     st.write(f"Goals: {team_2_dict['score']}")
     st.write(f"Win probability: {team_2_dict['probability']:.2%}")
 
-shootout_progress_df = pd.DataFrame.from_dict(
-    st.session_state.pk.shootout_progress, orient='index'
-).T
+# read the trajectory off the precomputed index rather than rebuilding it every rerun
 # switch this to altair_chart
 st.line_chart(
-    data=shootout_progress_df,
+    data=st.session_state.pk.trajectory(),
     x="kick",
     y=["team_1_probability", "team_2_probability"],
 )
@@ -92,8 +93,9 @@ After each kick, the simluator always switches to the next team kicking. You can
  the shootout and each team's probabilities throughout. 
 
 A few simple rules/explanations:
-- This simulator is only built to handle 10 kicks. If the shootout is tied after 10 kicks, we end
-the shootout and give each team a 50/50 shot to win.
+- If the shootout is tied after 10 kicks, it goes to sudden death and you can keep kicking until
+one team scores and the other misses. Sudden-death probabilities come from a simple model where
+every kick has the historic success rate.
 - Probabilities are determined empiricially based on the history of the world cup. For example, if
 the shootout is 2-2 after 4 kicks, I look at every shootout in World Cup history that was 2-2 after
 4 kicks and determine each teams odds of winning based on this history.